@@ -1,25 +1,46 @@
 # -*- coding: utf-8 -*-
-from datetime import datetime, timedelta
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache, wraps
+from itertools import repeat
 from urllib.parse import quote
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
 import logging
+import logging.handlers
 import os
+import hashlib
 import json  # For JSON formatting in logs
 import re    # For phone number sanitization
 import csv
+import threading
+import time
+
+try:
+    import orjson  # Optional: faster decoding of large list responses and log entries
+except ImportError:
+    orjson = None
 
 # Set up logging to write to 'console.log' in the same folder as the script
 script_dir = os.path.dirname(os.path.abspath(__file__))
 log_file = os.path.join(script_dir, 'console.log')
-logging.basicConfig(
-    filename=log_file,
-    filemode='w',  # Overwrite the log file each time the script runs
-    level=logging.INFO,
-    format='%(message)s'  # We'll handle JSON formatting ourselves
-)
+file_handler = logging.FileHandler(log_file, mode='w', encoding='utf-8')  # Overwrite the log file each time the script runs
+file_handler.setFormatter(logging.Formatter('%(message)s'))  # We'll handle JSON formatting ourselves
+# Buffer records and write them to the file in batches instead of flushing every line;
+# errors flush immediately and logging.shutdown() flushes the rest on exit
+log_handler = logging.handlers.MemoryHandler(capacity=256, flushLevel=logging.ERROR, target=file_handler)
+logging.basicConfig(level=logging.INFO, handlers=[log_handler])
+
+LOG_LEVELS = {"INFO": logging.INFO, "ERROR": logging.ERROR}
 
 # Helper function to log messages in JSON format
 def log_json(level, message, data=None):
+    log_level = LOG_LEVELS.get(level, logging.DEBUG)
+    # Don't build or serialize entries that would be filtered out anyway
+    if not logging.root.isEnabledFor(log_level):
+        return
     log_entry = {
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "level": level,
@@ -27,13 +48,11 @@ def log_json(level, message, data=None):
     }
     if data is not None:
         log_entry["data"] = data
-    json_log = json.dumps(log_entry, ensure_ascii=False)
-    if level == "INFO":
-        logging.info(json_log)
-    elif level == "ERROR":
-        logging.error(json_log)
+    if orjson is not None:
+        serialized = orjson.dumps(log_entry, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
     else:
-        logging.debug(json_log)
+        serialized = json.dumps(log_entry, ensure_ascii=False)
+    logging.log(log_level, serialized)
 
 # Load configurations from config.txt
 def load_config(file_path='config.txt'):
@@ -69,11 +88,166 @@ CUSTOMERS_PULL_PERIOD_DAYS = int(config.get('CUSTOMERS_PULL_PERIOD_DAYS', 2))
 
 CANCELLED_CONTRACT_STATUS_HEBREW = config.get('CANCELLED_CONTRACT_STATUS_HEBREW')
 ACTIVE_CUSTOMER_STATUS_HEBREW = config.get('ACTIVE_CUSTOMER_STATUS_HEBREW')
+
+# Max concurrent per-record requests to Atera (kept low to stay within Atera's rate limit)
+ATERA_MAX_WORKERS = int(config.get('ATERA_MAX_WORKERS', 8))
+# Max concurrent POSTs to Priority
+PRIORITY_MAX_WORKERS = int(config.get('PRIORITY_MAX_WORKERS', 4))
+# Atera allows a limited number of API calls per minute; requests are spaced to stay under it
+ATERA_REQUESTS_PER_MINUTE = int(config.get('ATERA_REQUESTS_PER_MINUTE', 600))
+# Seconds to wait for a connection or for response data before giving up on a request
+HTTP_TIMEOUT = float(config.get('HTTP_TIMEOUT', 30))
+
+# ------------------- HTTP SESSION -------------------
+# One shared session for all Atera and Priority calls, so consecutive requests
+# reuse the same keep-alive connection instead of a new TCP+TLS handshake each time
+SESSION = requests.Session()
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies HTTP_TIMEOUT to requests made without an explicit timeout."""
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = HTTP_TIMEOUT
+        return super().send(request, timeout=timeout, **kwargs)
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows bursts of `capacity` requests, then `rate` requests per second.
+    Each caller reserves a token and sleeps until it is due, so waiting threads go out in order.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+class RateLimitedHTTPAdapter(TimeoutHTTPAdapter):
+    """TimeoutHTTPAdapter that takes a token from `rate_limiter` before sending each request."""
+
+    def __init__(self, rate_limiter, **kwargs):
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        self.rate_limiter.acquire()
+        return super().send(request, **kwargs)
+
+# Retry transient server errors and rate limiting (429) with backoff, honouring Retry-After.
+# POST is not in urllib3's default retryable methods, so creates are never sent twice.
+# After the last retry the response is returned as-is and handled by the usual status checks.
+HTTP_RETRIES = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+for prefix in ('https://', 'http://'):
+    SESSION.mount(prefix, TimeoutHTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=HTTP_RETRIES))
+# Atera and Priority get their own adapters, sized to the number of threads that talk to each,
+# so a burst of Priority POSTs never competes with Atera reads for pooled connections.
+# Atera requests can come from the page prefetch and the per-record lookups at the same time.
+# All of them share one token bucket, so concurrent syncs together stay under Atera's rate limit
+# instead of running into 429s and retrying.
+ATERA_RATE_LIMITER = TokenBucket(ATERA_REQUESTS_PER_MINUTE / 60, capacity=2 * ATERA_MAX_WORKERS)
+SESSION.mount('https://app.atera.com/', RateLimitedHTTPAdapter(ATERA_RATE_LIMITER, pool_connections=1, pool_maxsize=2 * ATERA_MAX_WORKERS, max_retries=HTTP_RETRIES))
+# Contacts, contracts and tickets can all call Priority at once; pool_block makes extra callers
+# wait for a free connection, so at most PRIORITY_MAX_WORKERS requests are ever in flight there.
+if PRIORITY_API_URL:
+    SESSION.mount(PRIORITY_API_URL, TimeoutHTTPAdapter(pool_connections=1, pool_maxsize=PRIORITY_MAX_WORKERS, pool_block=True, max_retries=HTTP_RETRIES))
+# Ask for compressed bodies in every encoding urllib3 can decode here
+# (gzip/deflate, plus br/zstd when brotli/zstandard are installed).
+SESSION.headers['Accept-Encoding'] = make_headers(accept_encoding=True)['accept-encoding']
+
+def parse_json(response):
+    """Decode a response body, with orjson when it is installed and the body is raw bytes."""
+    if orjson is not None and isinstance(response.content, bytes):
+        return orjson.loads(response.content)
+    return response.json()
+
+@lru_cache(maxsize=None)
+def atera_custom_field_url_template(kind, field_name):
+    """URL template of an Atera custom value; built and URL-encoded once per kind and field name."""
+    return f"https://app.atera.com/api/v3/customvalues/{kind}/{{}}/{quote(field_name)}"
+
+def atera_custom_field_url(kind, record_id, field_name):
+    """URL of a record's custom value, e.g. ('customerfield', 1, 'Priority Customer Number')."""
+    return atera_custom_field_url_template(kind, field_name).format(record_id)
+
+# ------------------- PER-RUN CACHE -------------------
+# Atera lookups that several syncs repeat within one run (customer list, customer and contract custom fields).
+# Entries are dropped or updated by the functions that write the underlying data.
+# Concurrent callers asking for the same key while it is being fetched wait on the
+# first caller's request (_run_cache_inflight) instead of sending their own.
+_run_cache = {}
+_run_cache_inflight = {}
+_run_cache_lock = threading.Lock()
+
+def run_cached(kind):
+    """Decorator caching a function's result for the rest of the run, keyed by kind and arguments."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (kind,) + args + tuple(sorted(kwargs.items()))
+            with _run_cache_lock:
+                if key in _run_cache:
+                    return _run_cache[key]
+                inflight = _run_cache_inflight.get(key)
+                if inflight is None:
+                    inflight = _run_cache_inflight[key] = Future()
+                    fetching = True
+                else:
+                    fetching = False
+            if not fetching:
+                return inflight.result()
+            try:
+                value = func(*args, **kwargs)
+            except BaseException as e:
+                with _run_cache_lock:
+                    del _run_cache_inflight[key]
+                inflight.set_exception(e)
+                raise
+            with _run_cache_lock:
+                _run_cache[key] = value
+                del _run_cache_inflight[key]
+            inflight.set_result(value)
+            return value
+        return wrapper
+    return decorator
+
+def set_run_cache(kind, *args, value):
+    """Store a value we already know (e.g. one we just wrote) under kind and arguments."""
+    with _run_cache_lock:
+        _run_cache[(kind,) + args] = value
+
+def forget_run_cache(kind):
+    """Drop every cached entry of the given kind."""
+    with _run_cache_lock:
+        for key in [key for key in _run_cache if key[0] == kind]:
+            del _run_cache[key]
+
+def clear_run_cache():
+    """Drop the whole per-run cache."""
+    with _run_cache_lock:
+        _run_cache.clear()
+
 # ------------------- PHONE NUMBER SANITIZATION -------------------
+PHONE_ALLOWED_CHARS = frozenset('+-0123456789')
+
 def sanitize_phone_number(phone_number):
     """Sanitize phone numbers to include only '+', '-', and digits."""
     if not phone_number:
         return None
+    # Fast path: already well-formed ASCII numbers are returned as-is, skipping the regex
+    if phone_number.isascii() and PHONE_ALLOWED_CHARS.issuperset(phone_number):
+        return phone_number if any(c.isdigit() for c in phone_number) else None
     # Keep only '+', '-', and digits
     sanitized = re.sub(r'[^+\-\d]', '', phone_number)
     # Check if there are any digits left
@@ -82,93 +256,194 @@ def sanitize_phone_number(phone_number):
     else:
         return None
 
+# ------------------- SYNC STATE -------------------
+# Start times of the last successful sync per entity, e.g. {"customers": "2025-01-01T00:00:00Z"},
+# plus hashes of the payloads last written to Atera per record ("customer_payloads", "contact_payloads").
+# Delete the file to fall back to the configured pull period and rewrite every record on the next run.
+SYNC_STATE_FILE = os.path.join(script_dir, 'last_sync.json')
+
+def load_sync_state():
+    """Load the last-sync state file, or return an empty dict if it doesn't exist or is unreadable."""
+    try:
+        with open(SYNC_STATE_FILE, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        log_json("ERROR", "Error reading sync state file, ignoring it", {"exception": str(e), "file": SYNC_STATE_FILE})
+        return {}
+
+_sync_state_lock = threading.Lock()
+
+def save_sync_state(key, value):
+    """Store a single entry in the sync state file, replacing the file atomically."""
+    # Syncs running side by side must not interleave their read-modify-write of the file
+    with _sync_state_lock:
+        state = load_sync_state()
+        state[key] = value
+        tmp_file = SYNC_STATE_FILE + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as file:
+            json.dump(state, file, indent=2)
+        os.replace(tmp_file, SYNC_STATE_FILE)
+
+def get_last_sync(key):
+    """Return the start time of the last successful sync for key as a naive UTC datetime, or None."""
+    value = load_sync_state().get(key)
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', ''))
+
+def odata_datetime(value):
+    """Format a naive UTC datetime as an OData datetime literal."""
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def iso_cutoff(value):
+    """
+    Format a naive UTC datetime like the first 19 characters of an ISO-8601 timestamp.
+    API dates ("2024-01-10T10:00:00Z", optionally with fractions or an offset) can then be
+    filtered with `date[:19] >= cutoff`, which orders them like the parsed, offset-stripped
+    datetimes would, without building a datetime per record.
+    """
+    return value.strftime('%Y-%m-%dT%H:%M:%S')
+
+def parse_api_datetime(value):
+    """
+    Parse an API ISO-8601 timestamp ("2024-01-10T10:00:00+02:00", "...Z", or without an offset,
+    which is taken as UTC) into a naive UTC datetime. Returns None if value is not a timestamp.
+    """
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def payload_hash(*payload):
+    """Stable hash of the data written to Atera, to tell whether a record changed since the last sync."""
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
 # ------------------- SYNC CUSTOMERS -------------------
-def get_priority_customers(filter_by_date=True):
-    """Fetch customers from Priority with specific fields and filter by MARH_UDATE."""
-    select_fields = 'CUSTNAME,CUSTDES,HOSTNAME,WTAXNUM,PHONE,FAX,ADDRESS,STATDES,STATEA,STATENAME,STATE,ZIP,MARH_UDATE'
+PRIORITY_CUSTOMER_FIELDS = 'CUSTNAME,CUSTDES,HOSTNAME,WTAXNUM,PHONE,FAX,ADDRESS,STATDES,STATEA,STATENAME,STATE,ZIP,MARH_UDATE'
+
+def get_priority_customers(filter_by_date=True, since=None, select_fields=PRIORITY_CUSTOMER_FIELDS):
+    """
+    Fetch customers from Priority with specific fields and filter by MARH_UDATE.
+    Customers updated before `since` (default: CUSTOMERS_PULL_PERIOD_DAYS ago) are filtered
+    out by Priority itself, and again locally in case the server ignores the $filter.
+    Callers that only need a few fields can narrow `select_fields` (keep MARH_UDATE when filtering).
+    """
     url = f"{PRIORITY_API_URL}/CUSTOMERS?$select={select_fields}"
-    response = requests.get(url, auth=(PRIORITY_API_USER, PRIORITY_API_PASSWORD))
+    cutoff = since or datetime.utcnow() - timedelta(days=CUSTOMERS_PULL_PERIOD_DAYS)
+    if filter_by_date:
+        url += f"&$filter={quote(f'MARH_UDATE ge {odata_datetime(cutoff)}')}"
+    response = SESSION.get(url, auth=(PRIORITY_API_USER, PRIORITY_API_PASSWORD))
     if response.status_code != 200:
         log_json("ERROR", f"Error fetching Priority customers: {response.status_code}", {"response": response.text})
     response.raise_for_status()
-    all_customers = response.json()['value']
+    all_customers = parse_json(response)['value']
 
     if not filter_by_date:
         return all_customers
 
-    # Filter by MARH_UDATE in the last CUSTOMERS_PULL_PERIOD_DAYS
-    cutoff = datetime.utcnow() - timedelta(days=CUSTOMERS_PULL_PERIOD_DAYS)
-    filtered_customers = []
-    for cust in all_customers:
-        try:
-            udate_str = cust.get('MARH_UDATE')
-            if not udate_str:
-                # If there's no MARH_UDATE, skip or treat as never updated
-                continue
-            if '+' in udate_str:
-                udate_str = udate_str.split('+')[0]
-            elif 'Z' in udate_str:
-                udate_str = udate_str.replace('Z', '')
-            cust_udate = datetime.fromisoformat(udate_str)
-            if cust_udate >= cutoff:
-                filtered_customers.append(cust)
-        except Exception as e:
-            log_json("ERROR", "Error parsing MARH_UDATE", {"exception": str(e), "customer": cust})
-    return filtered_customers
+    # Filter by MARH_UDATE since the cutoff. Customers without MARH_UDATE are treated as never updated.
+    cutoff = iso_cutoff(cutoff)
+    return [cust for cust in all_customers if cust.get('MARH_UDATE') and cust['MARH_UDATE'][:19] >= cutoff]
 
-def get_atera_customers(fetch_custom_fields=True):
-    """Fetch all existing customers from Atera and their 'Priority Customer Number' custom field."""
+def get_atera_page(url, headers, description, page, items_in_page):
+    """Fetch one page of a paginated Atera list endpoint and return the decoded body."""
+    log_json("INFO", f"Fetching {description} from Atera, page {page}...")
+    params = {'page': page, 'itemsInPage': items_in_page}
+    response = SESSION.get(url, headers=headers, params=params)
+    if response.status_code != 200:
+        log_json("ERROR", f"Error fetching Atera {description}: {response.status_code}", {"response": response.text})
+        response.raise_for_status()
+    return parse_json(response)
+
+def iter_atera_pages(url, headers, description, items_in_page=50):
+    """
+    Yield the items of a paginated Atera list endpoint one page at a time, in page order.
+    Once the first page reports totalPages, the following pages are prefetched concurrently,
+    ATERA_MAX_WORKERS pages at a time; without it we follow nextLink page by page.
+    Stops on the first empty page.
+    """
+    data = get_atera_page(url, headers, description, 1, items_in_page)
+    items = data.get('items', [])
+    if not items:
+        return
+    yield items
+
+    total_pages = int(data.get('totalPages') or 0)
+    if not total_pages:
+        page = 1
+        while data.get('nextLink'):
+            page += 1
+            data = get_atera_page(url, headers, description, page, items_in_page)
+            items = data.get('items', [])
+            if not items:
+                return
+            yield items
+        return
+
+    with ThreadPoolExecutor(max_workers=ATERA_MAX_WORKERS) as executor:
+        for first_page in range(2, total_pages + 1, ATERA_MAX_WORKERS):
+            pages = range(first_page, min(first_page + ATERA_MAX_WORKERS, total_pages + 1))
+            for data in executor.map(lambda page: get_atera_page(url, headers, description, page, items_in_page), pages):
+                items = data.get('items', [])
+                if not items:
+                    return
+                yield items
+
+def iter_atera_customers(fetch_custom_fields=True):
+    """
+    Yield existing Atera customers page by page, with their 'Priority Customer Number'
+    custom field attached as 'PriorityCustomerNumber' when fetch_custom_fields is set.
+    """
     url = "https://app.atera.com/api/v3/customers"
     headers = {
         'X-Api-Key': ATERA_API_KEY
     }
-    customers = []
-    page = 1
-    items_in_page = 50  # Max items per page is 50
-
-    while True:
-        log_json("INFO", f"Fetching customers from Atera, page {page}...")
-        params = {'page': page, 'itemsInPage': items_in_page}
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code != 200:
-            log_json("ERROR", f"Error fetching Atera customers: {response.status_code}", {"response": response.text})
-            response.raise_for_status()
-        data = response.json()
-        items = data.get('items', [])
-        customers.extend(items)
-        if int(data['totalPages']) == page or not items:
-            break
-        page += 1
-
-    if not fetch_custom_fields:
-        return customers
-    # Now fetch the 'Priority Customer Number' custom field for each customer
-    for i, customer in enumerate(customers):
-        if (i + 1) % 100 == 0 or i == 0:
-            log_json("INFO", f"Fetching custom fields for customers {i + 1}/{len(customers)}...")
-        customer_id = customer['CustomerID']
-        custom_field_name = 'Priority Customer Number'
-        custom_field_value = get_atera_custom_field(customer_id, custom_field_name)
-        customer['PriorityCustomerNumber'] = custom_field_value
-
-    return customers
+    # Max items per page is 50. Custom fields are one request per customer, so they are
+    # fetched concurrently for the whole page.
+    with ThreadPoolExecutor(max_workers=ATERA_MAX_WORKERS) as executor:
+        for items in iter_atera_pages(url, headers, "customers", items_in_page=50):
+            if fetch_custom_fields:
+                log_json("INFO", f"Fetching custom fields for {len(items)} customers...")
+                customer_ids = [customer['CustomerID'] for customer in items]
+                values = executor.map(get_atera_custom_field, customer_ids, repeat('Priority Customer Number'))
+                for customer, value in zip(items, values):
+                    customer['PriorityCustomerNumber'] = value
+            yield from items
+
+@run_cached('atera_customers')
+def get_atera_customers(fetch_custom_fields=True):
+    """Fetch all existing customers from Atera and their 'Priority Customer Number' custom field."""
+    return list(iter_atera_customers(fetch_custom_fields))
 
+@run_cached('atera_customer_field')
 def get_atera_custom_field(customer_id, field_name):
-    """Fetch the value of a custom field for a specific customer."""
-    url = f"https://app.atera.com/api/v3/customvalues/customerfield/{customer_id}/{field_name}"
+    """
+    Fetch the value of a custom field for a specific customer (None if it is not set).
+    Any other error is raised, so it is never cached as a missing value for the rest of the run.
+    """
+    url = atera_custom_field_url('customerfield', customer_id, field_name)
     headers = {
         'X-Api-Key': ATERA_API_KEY,
         'Accept': 'text/html'
     }
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        return response.json()[0]['ValueAsString']
-    elif response.status_code == 404:
+    response = SESSION.get(url, headers=headers)
+    if response.status_code == 404:
         # Field not found for this customer
         return None
-    else:
+    if response.status_code != 200:
         log_json("ERROR", f"Error fetching custom field '{field_name}' for customer ID {customer_id}", {"status_code": response.status_code, "response": response.text})
+        response.raise_for_status()
+    # Same result as get_atera_customer_custom_field, which shares this cache key
+    data = response.json()
+    if not data:
         return None
+    return data[0].get('ValueAsString')
 
 def create_atera_customer(customer):
     """Create a customer in Atera, and then update the 'Priority Customer Number' custom field."""
@@ -195,27 +470,23 @@ def create_atera_customer(customer):
         "ZipCodeStr": customer.get('ZIP', '')
     }
 
-    response = requests.post(url, headers=headers, json=data)
+    response = SESSION.post(url, headers=headers, json=data)
     if response.status_code not in [200, 201]:
         log_json("ERROR", f"Error creating Atera customer '{customer['CUSTDES']}'", {"status_code": response.status_code, "response": response.text, "data": data})
         response.raise_for_status()
 
-    customer_id = response.json()['ActionID']
+    created = response.json()
+    customer_id = created['ActionID']
+    forget_run_cache('atera_customers')
 
     # Now update the 'Priority Customer Number' custom field
     update_atera_custom_field(customer_id, 'Priority Customer Number', customer['CUSTNAME'])
 
-    return response.json()
+    return created
 
-def update_atera_customer(customer_id, customer):
-    """Update an existing customer in Atera."""
-    url = f"https://app.atera.com/api/v3/customers/{customer_id}"
-    headers = {
-        'X-Api-Key': ATERA_API_KEY,
-        'Content-Type': 'application/json',
-        'Accept': 'application/json'
-    }
-    data = {
+def build_atera_customer_data(customer):
+    """Atera customer fields for an update, from a Priority customer."""
+    return {
         "CustomerName": customer['CUSTDES'],
         "BusinessNumber": customer.get('BUSINESSNUMBER', ''),
         "Domain": customer.get('DOMAIN', ''),
@@ -232,42 +503,104 @@ def update_atera_customer(customer_id, customer):
         "ZipCodeStr": customer.get('ZIP', '')
     }
 
-    response = requests.put(url, headers=headers, json=data)
+def update_atera_customer(customer_id, customer):
+    """Update an existing customer in Atera."""
+    url = f"https://app.atera.com/api/v3/customers/{customer_id}"
+    headers = {
+        'X-Api-Key': ATERA_API_KEY,
+        'Content-Type': 'application/json',
+        'Accept': 'application/json'
+    }
+    data = build_atera_customer_data(customer)
+
+    response = SESSION.put(url, headers=headers, json=data)
     if response.status_code not in [200, 201]:
         log_json("ERROR", f"Error updating Atera customer ID {customer_id}", {"status_code": response.status_code, "response": response.text, "data": data})
         response.raise_for_status()
+    forget_run_cache('atera_customers')
+    forget_run_cache('atera_customer')
 
-    # Update the 'Priority Customer Number' custom field in case it changed
-    update_atera_custom_field(customer_id, 'Priority Customer Number', customer['CUSTNAME'])
+    # Update the 'Priority Customer Number' custom field in case it changed. The current value
+    # was already fetched (and cached) along with the customer list, so this costs no extra GET.
+    if get_atera_custom_field(customer_id, 'Priority Customer Number') != customer['CUSTNAME']:
+        update_atera_custom_field(customer_id, 'Priority Customer Number', customer['CUSTNAME'])
 
     return response.json()
 
 def update_atera_custom_field(customer_id, field_name, value):
     """Update a custom field for a customer in Atera."""
-    url = f"https://app.atera.com/api/v3/customvalues/customerfield/{customer_id}/{quote(field_name)}"
+    url = atera_custom_field_url('customerfield', customer_id, field_name)
     headers = {
         'X-Api-Key': ATERA_API_KEY,
         'Content-Type': 'application/json',
         'Accept': 'text/html'
     }
     data = {"Value": value}
-    response = requests.put(url, headers=headers, json=data)
+    response = SESSION.put(url, headers=headers, json=data)
     if response.status_code not in [200, 201]:
         log_json("ERROR", f"Error updating custom field '{field_name}' for customer ID {customer_id}", {"status_code": response.status_code, "response": response.text, "data": data})
         response.raise_for_status()
+    set_run_cache('atera_customer_field', customer_id, field_name, value=value)
+    forget_run_cache('atera_customers')
+
+def upsert_atera_customer(customer, atera_customer_id_map, atera_customer_name_map, payload_hashes):
+    """
+    Update or create the Atera customer for one Priority customer, matching by Priority
+    Customer Number first and by name second. Records the written payload's hash in payload_hashes.
+    """
+    priority_customer_number = customer['CUSTNAME']
+    priority_customer_name = customer.get('CUSTDES', '').strip().lower()
+
+    log_json("INFO", f"Processing Priority customer", {"CUSTNAME": priority_customer_number, "CUSTDES": priority_customer_name})
+
+    # Try to find the customer in Atera by Priority Customer Number (ID)
+    customer_id = atera_customer_id_map.get(priority_customer_number)
+    customer_hash = payload_hash(build_atera_customer_data(customer), priority_customer_number)
+
+    if customer_id:
+        if payload_hashes.get(str(customer_id)) == customer_hash:
+            log_json("INFO", f"Customer unchanged since last sync. Skipping update.", {"CUSTDES": customer['CUSTDES'], "CustomerID": customer_id})
+            return
+        # Customer exists in both systems by ID, perform an update
+        log_json("INFO", f"Found matching customer in Atera by ID. Updating customer.", {"CUSTDES": customer['CUSTDES'], "CustomerID": customer_id})
+        update_atera_customer(customer_id, customer)
+        payload_hashes[str(customer_id)] = customer_hash
+    else:
+        # Try to find the customer in Atera by name
+        customer_id = atera_customer_name_map.get(priority_customer_name)
+        if customer_id:
+            # Customer exists in Atera by name, perform an update and set the Priority Customer Number
+            log_json("INFO", f"Found matching customer in Atera by name. Updating customer.", {"CUSTDES": customer['CUSTDES'], "CustomerID": customer_id})
+            update_atera_customer(customer_id, customer)
+            payload_hashes[str(customer_id)] = customer_hash
+        else:
+            # Customer does not exist in Atera, create it
+            log_json("INFO", f"No matching customer found in Atera. Creating customer.", {"CUSTDES": customer['CUSTDES']})
+            result = create_atera_customer(customer)
+            log_json("INFO", f"Customer created in Atera.", {"CUSTDES": customer['CUSTDES'], "ActionID": result['ActionID']})
 
 def sync_customers():
-    """Sync customers from Priority to Atera, performing upsert based on IDs and names."""
-    priority_customers = get_priority_customers()
-    atera_customers = get_atera_customers()
+    """
+    Sync customers from Priority to Atera, performing upsert based on IDs and names.
+    Only customers updated since the last successful run are pulled from Priority.
+    """
+    sync_started = datetime.utcnow()
+    priority_customers = get_priority_customers(since=get_last_sync('customers'))
+    if not priority_customers:
+        # Nothing changed in Priority, so there is no need to read Atera's customers at all
+        log_json("INFO", "No Priority customers updated since the last sync.")
+        save_sync_state('customers', odata_datetime(sync_started))
+        return
+    # What was last written to each Atera customer, to skip updates that would change nothing
+    payload_hashes = load_sync_state().get('customer_payloads', {})
 
-    # Build mappings:
+    # Build mappings in a single pass over the Atera customer pages:
     # - By 'Priority Customer Number' (ID)
     # - By 'CustomerName' (name)
     atera_customer_id_map = {}    # Mapping from Priority Customer Number to Atera CustomerID
     atera_customer_name_map = {}  # Mapping from CustomerName to Atera CustomerID
 
-    for customer in atera_customers:
+    for customer in iter_atera_customers():
         # Map by Priority Customer Number (ID)
         priority_customer_number = customer.get('PriorityCustomerNumber')
         if priority_customer_number:
@@ -280,70 +613,51 @@ def sync_customers():
 
     log_json("INFO", f"Atera customers by ID", {"atera_customer_id_map": atera_customer_id_map})
 
-    for customer in priority_customers:
-        priority_customer_number = customer['CUSTNAME']
-        priority_customer_name = customer.get('CUSTDES', '').strip().lower()
-
-        log_json("INFO", f"Processing Priority customer", {"CUSTNAME": priority_customer_number, "CUSTDES": priority_customer_name})
-
-        # Try to find the customer in Atera by Priority Customer Number (ID)
-        customer_id = atera_customer_id_map.get(priority_customer_number)
-
-        if customer_id:
-            # Customer exists in both systems by ID, perform an update
-            log_json("INFO", f"Found matching customer in Atera by ID. Updating customer.", {"CUSTDES": customer['CUSTDES'], "CustomerID": customer_id})
-            update_atera_customer(customer_id, customer)
-        else:
-            # Try to find the customer in Atera by name
-            customer_id = atera_customer_name_map.get(priority_customer_name)
-            if customer_id:
-                # Customer exists in Atera by name, perform an update and set the Priority Customer Number
-                log_json("INFO", f"Found matching customer in Atera by name. Updating customer.", {"CUSTDES": customer['CUSTDES'], "CustomerID": customer_id})
-                update_atera_customer(customer_id, customer)
-            else:
-                # Customer does not exist in Atera, create it
-                log_json("INFO", f"No matching customer found in Atera. Creating customer.", {"CUSTDES": customer['CUSTDES']})
-                result = create_atera_customer(customer)
-                log_json("INFO", f"Customer created in Atera.", {"CUSTDES": customer['CUSTDES'], "ActionID": result['ActionID']})
+    # Atera has no bulk customer endpoint, so the per-customer writes are spread over
+    # ATERA_MAX_WORKERS connections instead. Every customer is attempted; the first
+    # failure is re-raised once all have been processed.
+    with ThreadPoolExecutor(max_workers=ATERA_MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(upsert_atera_customer, customer, atera_customer_id_map, atera_customer_name_map, payload_hashes)
+            for customer in priority_customers
+        ]
+    # Keep the hashes of what was written even if some customers failed
+    save_sync_state('customer_payloads', payload_hashes)
+    for future in futures:
+        future.result()
+
+    # Only advance the cursor after every customer went through
+    save_sync_state('customers', odata_datetime(sync_started))
 
 # ------------------- SYNC CONTACTS -------------------
 def get_priority_contacts():
     """Fetch contacts from Priority with specific fields."""
     select_fields = 'CUSTNAME,CUSTDES,EMAIL,NAME,FIRSTNAME,LASTNAME,POSITIONDES,PHONENUM,CELLPHONE'
     url = f"{PRIORITY_API_URL}/PHONEBOOK?$select={select_fields}"
-    response = requests.get(url, auth=(PRIORITY_API_USER, PRIORITY_API_PASSWORD))
+    response = SESSION.get(url, auth=(PRIORITY_API_USER, PRIORITY_API_PASSWORD))
     if response.status_code != 200:
         log_json("ERROR", f"Error fetching Priority contacts: {response.status_code}", {"response": response.text})
     response.raise_for_status()
-    return response.json()['value']
-
-def get_atera_contacts():
-    """Fetch all contacts from Atera, handling pagination."""
-    contacts = []
-    page = 1
-    while True:
-        url = f"https://app.atera.com/api/v3/contacts?page={page}&itemsInPage=100"
-        headers = {
-            'X-Api-Key': ATERA_API_KEY,
-            'Accept': 'application/json'
-        }
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            log_json("ERROR", f"Error fetching contacts from Atera", {"status_code": response.status_code, "response": response.text})
-            response.raise_for_status()
-        data = response.json()
-        contacts.extend(data['items'])
-        if not data.get('nextLink'):
-            break
-        page += 1
-    return contacts
+    return parse_json(response)['value']
+
+def iter_atera_contacts():
+    """Yield all contacts from Atera, handling pagination."""
+    url = "https://app.atera.com/api/v3/contacts"
+    headers = {
+        'X-Api-Key': ATERA_API_KEY,
+        'Accept': 'application/json'
+    }
+    for items in iter_atera_pages(url, headers, "contacts", items_in_page=100):
+        yield from items
 
 def sync_contacts():
     """Sync contacts from Priority to Atera, performing upsert based on contact name."""
     # Fetch contacts and customers from both systems
     priority_contacts = get_priority_contacts()
-    atera_contacts = get_atera_contacts()
+    # Shared with sync_contracts within the same run
     atera_customers = get_atera_customers()
+    # What was last written to each Atera contact, to skip updates that would change nothing
+    payload_hashes = load_sync_state().get('contact_payloads', {})
 
     # Build a mapping of 'Priority Customer Number' to Atera customer IDs
     atera_customer_map = {}
@@ -354,14 +668,21 @@ def sync_contacts():
 
     # Build a mapping of contacts in Atera based on CustomerID and Full Name
     atera_contact_map = {}
-    for contact in atera_contacts:
+    # Which contact (by lowercased full name) owns each email, so generated emails stay unique
+    email_owners = {}
+    email_suffixes = {}
+    for contact in iter_atera_contacts():
         customer_id = contact['CustomerID']
         full_name = f"{contact.get('Firstname', '').strip()} {contact.get('Lastname', '').strip()}".strip()
         if customer_id and full_name:
             key = (customer_id, full_name.lower())
             atera_contact_map[key] = contact
+        atera_email = (contact.get('Email') or '').strip().lower()
+        if customer_id and atera_email:
+            email_owners.setdefault(atera_email, full_name.lower())
 
     # Now sync contacts
+    contacts_to_write = []
     for contact in priority_contacts:
         try:
             priority_customer_number = contact['CUSTNAME']
@@ -393,18 +714,26 @@ def sync_contacts():
 
             full_name = f"{first_name} {last_name}".strip()
             key = (customer_id, full_name.lower())
-            existing_contact = atera_contact_map.get(key)
 
             # Handle potential null email
             email = contact.get('EMAIL', '')
             if email:
                 email = email.strip().lower()
+                email_owners.setdefault(email, full_name.lower())
             else:
-                # Generate unique email using contact name and customer ID
+                # Generate unique email using contact name and customer ID. If a different
+                # contact already owns it (in Atera or earlier in this run), add a numeric suffix.
                 sanitized_name = (first_name + last_name).replace(' ', '').lower()
-                email = f"{sanitized_name}{customer_id}@example.com"
+                base = f"{sanitized_name}{customer_id}"
+                email = f"{base}@example.com"
+                while email_owners.setdefault(email, full_name.lower()) != full_name.lower():
+                    email_suffixes[base] = email_suffixes.get(base, 1) + 1
+                    email = f"{base}-{email_suffixes[base]}@example.com"
                 log_json("INFO", f"No email for contact '{full_name}'. Generated email.", {"generated_email": email})
 
+            # Match by name only: contacts of one customer may share an address (e.g. an office mailbox)
+            existing_contact = atera_contact_map.get(key)
+
             contact['FIRSTNAME'] = first_name
             contact['LASTNAME'] = last_name
             contact['EMAIL'] = email
@@ -413,32 +742,57 @@ def sync_contacts():
             contact['PHONENUM'] = sanitize_phone_number(contact.get('PHONENUM'))
             contact['CELLPHONE'] = sanitize_phone_number(contact.get('CELLPHONE'))
 
-            if existing_contact:
-                # Update the contact in Atera
-                contact_id = existing_contact['EndUserID']
-                update_atera_contact(contact_id, contact)
-                log_json("INFO", f"Contact updated in Atera.", {"contact_id": contact_id, "contact_data": contact})
-            else:
-                # Create the contact in Atera
-                create_atera_contact(customer_id, contact)
-                log_json("INFO", f"Contact created in Atera.", {"contact_data": contact})
+            contact_id = existing_contact['EndUserID'] if existing_contact else None
+            if contact_id and payload_hashes.get(str(contact_id)) == payload_hash(build_atera_contact_data(contact)):
+                log_json("INFO", f"Contact unchanged since last sync. Skipping update.", {"contact_id": contact_id})
+                continue
+            contacts_to_write.append((customer_id, contact_id, contact))
         except Exception as e:
             # Log as ERROR and include full contact data
             log_json("ERROR", f"Error processing contact: {e}", {"contact": contact})
             continue
 
+    # Matching and email generation above stay sequential so their results do not depend
+    # on timing; only the per-contact writes are spread over ATERA_MAX_WORKERS connections.
+    with ThreadPoolExecutor(max_workers=ATERA_MAX_WORKERS) as executor:
+        for customer_id, contact_id, contact in contacts_to_write:
+            executor.submit(write_atera_contact, customer_id, contact_id, contact, payload_hashes)
+
+    save_sync_state('contact_payloads', payload_hashes)
+
+def write_atera_contact(customer_id, contact_id, contact, payload_hashes):
+    """
+    Update the matched Atera contact, or create one when contact_id is None. Errors are
+    logged rather than raised so one bad contact does not stop the others.
+    """
+    try:
+        if contact_id:
+            update_atera_contact(contact_id, contact)
+            payload_hashes[str(contact_id)] = payload_hash(build_atera_contact_data(contact))
+            log_json("INFO", f"Contact updated in Atera.", {"contact_id": contact_id, "contact_data": contact})
+        else:
+            create_atera_contact(customer_id, contact)
+            log_json("INFO", f"Contact created in Atera.", {"contact_data": contact})
+    except Exception as e:
+        # Log as ERROR and include full contact data
+        log_json("ERROR", f"Error processing contact: {e}", {"contact": contact})
+
+
+_failed_emails_lock = threading.Lock()
 
 def log_failed_duplicate_email(customer_id, priority_customer_id, email):
     """Log failed duplicate emails to a CSV file."""
     file_path = 'failed_duplicated_emails.csv'
-    file_exists = os.path.isfile(file_path)
-    with open(file_path, mode='a', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        if not file_exists:
-            # Write header if the file doesn't exist
-            writer.writerow(['CustomerID', 'PriorityCustomerID', 'EmailAddress'])
-        # Write the failed email
-        writer.writerow([customer_id, priority_customer_id, email])
+    # Contacts are created concurrently; keep the header check and row append together
+    with _failed_emails_lock:
+        file_exists = os.path.isfile(file_path)
+        with open(file_path, mode='a', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            if not file_exists:
+                # Write header if the file doesn't exist
+                writer.writerow(['CustomerID', 'PriorityCustomerID', 'EmailAddress'])
+            # Write the failed email
+            writer.writerow([customer_id, priority_customer_id, email])
 
 def create_atera_contact(customer_id, contact):
     """Create a contact in Atera."""
@@ -461,7 +815,7 @@ def create_atera_contact(customer_id, contact):
         "CreatedOn": datetime.utcnow().isoformat() + "Z"
     }
 
-    response = requests.post(url, headers=headers, json=data)
+    response = SESSION.post(url, headers=headers, json=data)
     if response.status_code == 409:
         # Log the duplicate email issue along with the Priority Customer ID
         priority_customer_id = contact.get('CUSTNAME', '')
@@ -473,15 +827,9 @@ def create_atera_contact(customer_id, contact):
     else:
         log_json("INFO", f"Contact created in Atera.", {"contact_data": data})
 
-def update_atera_contact(contact_id, contact):
-    """Update an existing contact in Atera."""
-    url = f"https://app.atera.com/api/v3/contacts/{contact_id}"
-    headers = {
-        'X-Api-Key': ATERA_API_KEY,
-        'Content-Type': 'application/json',
-        'Accept': 'application/json'
-    }
-    data = {
+def build_atera_contact_data(contact):
+    """Atera contact fields for an update, from a prepared Priority contact."""
+    return {
         "Email": contact['EMAIL'],
         "Firstname": contact['FIRSTNAME'] or contact['NAME'],
         "Lastname": contact['LASTNAME'] or contact['NAME'],
@@ -491,7 +839,17 @@ def update_atera_contact(contact_id, contact):
         "IsContactPerson": True,
         "InIgnoreMode": False
     }
-    response = requests.post(url, headers=headers, json=data)
+
+def update_atera_contact(contact_id, contact):
+    """Update an existing contact in Atera."""
+    url = f"https://app.atera.com/api/v3/contacts/{contact_id}"
+    headers = {
+        'X-Api-Key': ATERA_API_KEY,
+        'Content-Type': 'application/json',
+        'Accept': 'application/json'
+    }
+    data = build_atera_contact_data(contact)
+    response = SESSION.post(url, headers=headers, json=data)
     if response.status_code not in [200, 201]:
         # Log as ERROR and include full data sent
         log_json("ERROR", f"Error updating contact ID {contact_id}", {"status_code": response.status_code, "response": response.text, "data": data})
@@ -512,7 +870,7 @@ def update_atera_contact(contact_id, contact):
 #         'X-Api-Key': ATERA_API_KEY,
 #         'Accept': 'application/json'
 #     }
-#     response = requests.delete(url, headers=headers)
+#     response = SESSION.delete(url, headers=headers)
 #     if response.status_code == 204:
 #         log_json("INFO", f"Customer deleted successfully.", {"CustomerID": customer_id})
 #     else:
@@ -529,39 +887,27 @@ def get_atera_tickets(days_back):
         'Accept': 'application/json'
     }
     tickets = []
-    page = 1
-    items_in_page = 50
-    cutoff_date = datetime.utcnow() - timedelta(days=days_back)
-    while True:
-        params = {
-            'page': page,
-            'itemsInPage': items_in_page
-        }
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code != 200:
-            log_json("ERROR", "Error fetching tickets from Atera", {"status_code": response.status_code, "response": response.text})
-            response.raise_for_status()
-
-        data = response.json()
-        fetched_items = data.get('items', [])
-        if not fetched_items:
-            break
-        for ticket in fetched_items:
-            created_date_str = ticket.get('TicketCreatedDate')
-            if created_date_str:
-                if "+" in created_date_str:
-                    # remove the offset part
-                    created_date = datetime.fromisoformat(created_date_str.split("+")[0])
-                elif "Z" in created_date_str:
-                    # remove the Z part
-                    created_date = datetime.fromisoformat(created_date_str.replace("Z", ""))
-                else:
-                    created_date = datetime.fromisoformat(created_date_str)
-                if created_date >= cutoff_date:
-                    tickets.append(ticket)
-        if not data.get('nextLink'):
-            break
-        page += 1
+    cutoff = iso_cutoff(datetime.utcnow() - timedelta(days=days_back))
+    # Stays True while every creation date seen so far is no newer than the one before it.
+    # When Atera returns tickets newest first, the first page that ends before the cutoff
+    # is the last one we need; in any other order every page is read.
+    newest_first = True
+    last_created = None
+    for fetched_items in iter_atera_pages(url, headers, "tickets", items_in_page=50):
+        created = [(ticket.get('TicketCreatedDate') or '')[:19] for ticket in fetched_items]
+        tickets.extend(
+            ticket for ticket, created_at in zip(fetched_items, created)
+            if created_at and created_at >= cutoff
+        )
+        if newest_first:
+            dates = [created_at for created_at in created if created_at]
+            if last_created is not None:
+                dates.insert(0, last_created)
+            newest_first = all(newer >= older for newer, older in zip(dates, dates[1:]))
+            if dates:
+                last_created = dates[-1]
+            if newest_first and last_created is not None and last_created < cutoff:
+                break
     return tickets
 
 def send_ticket_to_priority(custname, docno, tquant, ticket_status, payment_type):
@@ -578,13 +924,25 @@ def send_ticket_to_priority(custname, docno, tquant, ticket_status, payment_type
         "ATERASTATUS": ticket_status,
         "ATERATICKETTYPE": payment_type,
     }
-    response = requests.post(url, headers=headers, auth=auth, json=data)
+    response = SESSION.post(url, headers=headers, auth=auth, json=data)
     if response.status_code not in [200, 201]:
         log_json("ERROR", "Error sending ticket to Priority", {"status_code": response.status_code, "response": response.text, "data": data})
         response.raise_for_status()
     else:
         log_json("INFO", "Ticket sent to Priority", {"data": data})
 
+def send_tickets_to_priority(tickets_data):
+    """
+    Send prepared tickets to Priority. MARH_LOADATERA accepts one row per POST, so rather
+    than one bulk payload the POSTs are spread over PRIORITY_MAX_WORKERS connections, in no
+    fixed order. Every ticket is attempted; the first failure is re-raised once all have been sent.
+    """
+    with ThreadPoolExecutor(max_workers=PRIORITY_MAX_WORKERS) as executor:
+        futures = [executor.submit(send_ticket_to_priority, *ticket_data) for ticket_data in tickets_data]
+    for future in futures:
+        future.result()
+
+@run_cached('atera_customer')
 def get_atera_customer(customer_id):
     """
     Fetch a single customer record from Atera by customer_id.
@@ -595,7 +953,7 @@ def get_atera_customer(customer_id):
         'X-Api-Key': ATERA_API_KEY,
         'Accept': 'application/json'
     }
-    response = requests.get(url, headers=headers)
+    response = SESSION.get(url, headers=headers)
     if response.status_code == 404:
         # Not found
         return None
@@ -609,17 +967,18 @@ def get_atera_customer(customer_id):
     return response.json()
 
 
+@run_cached('atera_customer_field')
 def get_atera_customer_custom_field(customer_id, field_name):
     """
     Fetch a single custom field by name for a given Atera customer_id.
     Returns the field's value or None if 404 or field does not exist.
     """
-    url = f"https://app.atera.com/api/v3/customvalues/customerfield/{customer_id}/{quote(field_name)}"
+    url = atera_custom_field_url('customerfield', customer_id, field_name)
     headers = {
         'X-Api-Key': ATERA_API_KEY,
         'Accept': 'application/json'
     }
-    response = requests.get(url, headers=headers)
+    response = SESSION.get(url, headers=headers)
     if response.status_code == 404:
         # Custom field not found
         return None
@@ -637,12 +996,12 @@ def get_atera_customer_custom_field(customer_id, field_name):
 
 def get_atera_ticket_custom_field(ticket_id, field_name):
     """Fetch a custom field value for a given ticket."""
-    url = f"https://app.atera.com/api/v3/customvalues/ticketfield/{ticket_id}/{quote(field_name)}"
+    url = atera_custom_field_url('ticketfield', ticket_id, field_name)
     headers = {
         'X-Api-Key': ATERA_API_KEY,
         'Accept': 'application/json'
     }
-    response = requests.get(url, headers=headers)
+    response = SESSION.get(url, headers=headers)
     if response.status_code == 404:
         return None
     response.raise_for_status()
@@ -651,11 +1010,29 @@ def get_atera_ticket_custom_field(ticket_id, field_name):
         return None
     return data[0]['ValueAsString']  # or data[0]['ValueAsDecimal'] if you prefer
 
+def get_priority_customer_number_for_ticket_customer(customer_id):
+    """
+    Resolve the Priority CUSTNAME of an Atera customer through its 'Priority Customer Number'
+    custom field. Returns None if the customer doesn't exist in Atera or the field is empty.
+    """
+    atera_customer = get_atera_customer(customer_id)
+    if not atera_customer:
+        log_json("ERROR", "No customer record found in Atera for this ticket's CustomerID", {"CustomerID": customer_id})
+        return None
+    return get_atera_customer_custom_field(customer_id, "Priority Customer Number")
+
+def get_ticket_billing_fields(ticket_id):
+    """Fetch the 'Technician Billable Hours' and 'Payment' custom fields of a ticket."""
+    tech_hours_str = get_atera_ticket_custom_field(ticket_id, "Technician Billable Hours")
+    payment_type = get_atera_ticket_custom_field(ticket_id, "Payment")
+    return tech_hours_str, payment_type
+
 def sync_tickets():
     """
-    In this revised version, we no longer fetch all Atera customers at once.
-    Instead, we create a cache dict and fetch customers on demand based on the
-    tickets' CustomerID. This avoids long loading times for large customer bases.
+    Sync recent Atera tickets to Priority. Atera customers are not fetched all at once;
+    each distinct CustomerID on the tickets is resolved to a Priority CUSTNAME on demand.
+    The per-customer and per-ticket Atera lookups run concurrently, and the tickets are then
+    posted to Priority concurrently as well, so the order they arrive in Priority is not guaranteed.
     """
     log_json("INFO", "Syncing tickets from Atera to Priority...")
 
@@ -665,70 +1042,57 @@ def sync_tickets():
         log_json("INFO", "No tickets found for syncing.")
         return
 
-    # 2. Prepare a local cache for mapping Atera CustomerID => Priority CUSTNAME
-    priority_customer_cache = {}  # { customer_id: "CUSTNAME" }
+    with ThreadPoolExecutor(max_workers=ATERA_MAX_WORKERS) as executor:
+        # 2. Map each distinct Atera CustomerID => Priority CUSTNAME (None if not found)
+        customer_ids = list({ticket['CustomerID'] for ticket in tickets if ticket.get('CustomerID')})
+        priority_customer_cache = dict(zip(customer_ids, executor.map(get_priority_customer_number_for_ticket_customer, customer_ids)))
 
-    for ticket in tickets:
-        customer_id = ticket.get('CustomerID')
-        if not customer_id:
-            log_json("ERROR", "Ticket does not have a CustomerID; cannot sync.", {
-                "TicketID": ticket.get('TicketID')
-            })
-            continue
+        syncable_tickets = []  # [(ticket, custname)]
+        for ticket in tickets:
+            customer_id = ticket.get('CustomerID')
+            if not customer_id:
+                log_json("ERROR", "Ticket does not have a CustomerID; cannot sync.", {
+                    "TicketID": ticket.get('TicketID')
+                })
+                continue
 
-        # If we have not already cached this customer's Priority Customer Number:
-        if customer_id not in priority_customer_cache:
-            # Fetch the single Atera customer
-            atera_customer = get_atera_customer(customer_id)
-            if not atera_customer:
+            custname = priority_customer_cache[customer_id]
+            if not custname:
                 log_json("ERROR",
-                         "No customer record found in Atera for this ticket's CustomerID",
+                         "No Priority customer number found for ticket (custom field is empty).",
                          {"TicketID": ticket.get('TicketID'), "CustomerID": customer_id})
-                # We can store an empty string or None to avoid repeated lookups
-                priority_customer_cache[customer_id] = None
                 continue
+            syncable_tickets.append((ticket, custname))
 
-            # Fetch the "Priority Customer Number" custom field
-            priority_customer_number = get_atera_customer_custom_field(
-                customer_id,
-                "Priority Customer Number"
-            )
-
-            # Cache the result (could be None if the field doesn't exist)
-            priority_customer_cache[customer_id] = priority_customer_number
-
-        # At this point we have a Priority CUSTNAME (or None) in the cache
-        custname = priority_customer_cache[customer_id]
-        if not custname:
-            log_json("ERROR",
-                     "No Priority customer number found for ticket (custom field is empty).",
-                     {"TicketID": ticket.get('TicketID'), "CustomerID": customer_id})
-            continue
+        # 3. Fetch the Technician Billable Hours and Payment custom fields of every ticket
+        billing_fields = executor.map(get_ticket_billing_fields, [ticket.get('TicketID') for ticket, _ in syncable_tickets])
 
-        # 3. Prepare the data to send to Priority
-        ticket_status = ticket['TicketStatus']
-        docno = str(ticket.get('TicketID'))
-
-        # Fetch the custom field Technician Billable Hours
-        tech_hours_str = get_atera_ticket_custom_field(ticket.get('TicketID'), "Technician Billable Hours")
-        payment_type = get_atera_ticket_custom_field(ticket.get('TicketID'), "Payment")
-        if not tech_hours_str:
-            # Fall back to 0 if missing or error
-            tquant = 0
-            log_json("ERROR", "Failed to fetch Technician Billable Hours custom field.", {
-                "TicketID": ticket.get('TicketID')
-            })
-        else:
-            try:
-                tquant = float(tech_hours_str)
-            except ValueError:
-                log_json("ERROR", "Failed to parse Technician Billable Hours custom field as float.", {
-                    "TicketID": ticket.get('TicketID'),
-                    "TechHoursValue": tech_hours_str
-                })
+        # 4. Prepare the data to send to Priority
+        tickets_data = []  # [(custname, docno, tquant, ticket_status, payment_type)]
+        for (ticket, custname), (tech_hours_str, payment_type) in zip(syncable_tickets, billing_fields):
+            ticket_status = ticket['TicketStatus']
+            docno = str(ticket.get('TicketID'))
+
+            if not tech_hours_str:
+                # Fall back to 0 if missing or error
                 tquant = 0
+                log_json("ERROR", "Failed to fetch Technician Billable Hours custom field.", {
+                    "TicketID": ticket.get('TicketID')
+                })
+            else:
+                try:
+                    tquant = float(tech_hours_str)
+                except ValueError:
+                    log_json("ERROR", "Failed to parse Technician Billable Hours custom field as float.", {
+                        "TicketID": ticket.get('TicketID'),
+                        "TechHoursValue": tech_hours_str
+                    })
+                    tquant = 0
+
+            tickets_data.append((custname, docno, tquant, ticket_status, payment_type))
 
-        send_ticket_to_priority(custname, docno, tquant, ticket_status, payment_type)
+    # 5. Send all prepared tickets to Priority
+    send_tickets_to_priority(tickets_data)
 
 
 def get_priority_contracts_mock():
@@ -745,39 +1109,25 @@ def get_priority_contracts_mock():
         }
     ]
 
-def get_priority_contracts():
+def get_priority_contracts(since=None):
     """
-    Fetch contracts from Priority, then filter by UDATE within PULL_PERIOD_DAYS.
+    Fetch contracts from Priority updated since `since` (default: PULL_PERIOD_DAYS ago).
+    Priority filters by UDATE itself; the local UDATE check stays in case the server ignores the $filter.
     Example response fields: CUSTNAME, CUSTDES, DOCNO, UDATE, VALIDDATE, EXPIRYDATE, STATDES, UNI_DESC
     """
-    url = f"{PRIORITY_API_URL}/DOCUMENTS_Z"
-    response = requests.get(url, auth=(PRIORITY_API_USER, PRIORITY_API_PASSWORD))
+    select_fields = 'CUSTNAME,CUSTDES,DOCNO,UDATE,VALIDDATE,EXPIRYDATE,STATDES,UNI_DESC'
+    cutoff = since or datetime.utcnow() - timedelta(days=PULL_PERIOD_DAYS)
+    url = f"{PRIORITY_API_URL}/DOCUMENTS_Z?$select={select_fields}"
+    url += f"&$filter={quote(f'UDATE ge {odata_datetime(cutoff)}')}"
+    response = SESSION.get(url, auth=(PRIORITY_API_USER, PRIORITY_API_PASSWORD))
     if response.status_code != 200:
         log_json("ERROR", f"Error fetching Priority contracts: {response.status_code}", {"response": response.text})
         response.raise_for_status()
-    all_contracts = response.json().get('value', [])
+    all_contracts = parse_json(response).get('value', [])
 
-    # Filter by UDATE in last PULL_PERIOD_DAYS
-    cutoff = datetime.utcnow() - timedelta(days=PULL_PERIOD_DAYS)
-    filtered = []
-    for c in all_contracts:
-        try:
-            # The Priority response might have an offset, handle that
-            udate_str = c.get('UDATE')
-            if not udate_str:
-                continue
-            # remove possible offset or 'Z'
-            if '+' in udate_str:
-                udate_str = udate_str.split('+')[0]
-            elif 'Z' in udate_str:
-                udate_str = udate_str.replace('Z', '')
-            contract_udate = datetime.fromisoformat(udate_str)
-
-            if contract_udate >= cutoff:
-                filtered.append(c)
-        except Exception as e:
-            log_json("ERROR", "Error parsing UDATE", {"exception": str(e), "contract": c})
-    return filtered
+    # Filter by UDATE since the cutoff
+    cutoff = iso_cutoff(cutoff)
+    return [c for c in all_contracts if c.get('UDATE') and c['UDATE'][:19] >= cutoff]
 
 def get_atera_contracts_for_customer(customer_id):
     """
@@ -786,28 +1136,7 @@ def get_atera_contracts_for_customer(customer_id):
     """
     url = f"https://app.atera.com/api/v3/contracts/customer/{customer_id}"
     headers = {'X-Api-Key': ATERA_API_KEY, 'Accept': 'application/json'}
-    contracts = []
-    page = 1
-    items_in_page = 50
-
-    while True:
-        params = {'page': page, 'itemsInPage': items_in_page}
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code != 200:
-            log_json("ERROR", "Error fetching Atera contracts", {
-                "status_code": response.status_code,
-                "response": response.text
-            })
-            response.raise_for_status()
-        data = response.json()
-        page_contracts = data.get('items', [])
-        if not page_contracts:
-            break
-        contracts.extend(page_contracts)
-        if not data.get('nextLink'):
-            break
-        page += 1
-    return contracts
+    return [contract for items in iter_atera_pages(url, headers, "contracts", items_in_page=50) for contract in items]
 
 
 def create_atera_contract(customer_id, contract):
@@ -848,7 +1177,7 @@ def create_atera_contract(customer_id, contract):
         }
     }
 
-    response = requests.post(url, headers=headers, json=data)
+    response = SESSION.post(url, headers=headers, json=data)
     if response.status_code not in [200, 201]:
         log_json("ERROR", "Error creating contract in Atera", {
             "status_code": response.status_code,
@@ -857,27 +1186,28 @@ def create_atera_contract(customer_id, contract):
         })
         response.raise_for_status()
 
-    created_id = response.json().get('ActionID')
+    created = response.json()
+    created_id = created.get('ActionID')
     if created_id:
         # Update custom field "Priority Contract Number" with DOCNO
         update_atera_contract_custom_field(created_id, "Priority Contract Number", contract['DOCNO'])
         log_json("INFO", f"Created contract in Atera for Priority DOCNO={contract['DOCNO']}", {"ContractID": created_id})
 
-    return response.json()
+    return created
 
 def update_atera_contract_custom_field(contract_id, field_name, value):
     """
     Same pattern as updating a custom field on a customer, but for contracts.
     If the route is /api/v3/customvalues/contractfield/{contractId}/{fieldName}, do:
     """
-    url = f"https://app.atera.com/api/v3/customvalues/contractfield/{contract_id}/{quote(field_name)}"
+    url = atera_custom_field_url('contractfield', contract_id, field_name)
     headers = {
         'X-Api-Key': ATERA_API_KEY,
         'Content-Type': 'application/json',
         'Accept': 'text/html'
     }
     data = {"Value": value}
-    response = requests.put(url, headers=headers, json=data)
+    response = SESSION.put(url, headers=headers, json=data)
     if response.status_code not in [200,201]:
         log_json("ERROR", "Error updating contract custom field", {
             "status_code": response.status_code,
@@ -885,18 +1215,20 @@ def update_atera_contract_custom_field(contract_id, field_name, value):
             "data": data
         })
         response.raise_for_status()
+    set_run_cache('atera_contract_field', contract_id, field_name, value=value)
 
 
+@run_cached('atera_contract_field')
 def get_atera_contract_custom_field(contract_id, field_name):
     """
     Fetches a custom field value (ValueAsString) for a given contract in Atera.
     """
-    url = f"https://app.atera.com/api/v3/customvalues/contractfield/{contract_id}/{quote(field_name)}"
+    url = atera_custom_field_url('contractfield', contract_id, field_name)
     headers = {
         'X-Api-Key': ATERA_API_KEY,
         'Accept': 'application/json'
     }
-    response = requests.get(url, headers=headers)
+    response = SESSION.get(url, headers=headers)
     if response.status_code == 404:
         return None
     if response.status_code != 200:
@@ -910,20 +1242,38 @@ def get_atera_contract_custom_field(contract_id, field_name):
         return None
     return data[0]['ValueAsString']
 
+def get_atera_contract_custom_fields(contract_ids, field_name):
+    """
+    Fetch a custom field for several contracts, as {contract_id: value}.
+    Atera only serves contract custom values one contract at a time, so the
+    lookups run concurrently on ATERA_MAX_WORKERS threads.
+    """
+    contract_ids = list(contract_ids)
+    with ThreadPoolExecutor(max_workers=ATERA_MAX_WORKERS) as executor:
+        values = executor.map(get_atera_contract_custom_field, contract_ids, repeat(field_name))
+        return dict(zip(contract_ids, values))
+
 
 def sync_contracts():
+    """
+    Sync contracts from Priority to Atera, creating the ones Atera does not have yet.
+    Only contracts updated since the last successful run are pulled from Priority.
+    """
     log_json("INFO", "Syncing contracts from Priority to Atera...")
+    sync_started = datetime.utcnow()
 
     # 1) Get all Priority customers so we can check if customer is active
-    priority_customers_list = get_priority_customers(filter_by_date=False)
+    # Only the name and status are needed here, and this reads every customer, so select just those
+    priority_customers_list = get_priority_customers(filter_by_date=False, select_fields='CUSTDES,STATDES')
     # Map them by CUSTDES for quick lookup
     priority_customers_map = {c['CUSTDES']: c for c in priority_customers_list}
 
     # 2) Fetch relevant contracts
-    priority_contracts = get_priority_contracts()
+    priority_contracts = get_priority_contracts(since=get_last_sync('contracts'))
     # priority_contracts = get_priority_contracts_mock()
     if not priority_contracts:
         log_json("INFO", "No Priority contracts found for the given period.")
+        save_sync_state('contracts', odata_datetime(sync_started))
         return
 
     # Build map of Priority -> Atera customer IDs
@@ -931,6 +1281,13 @@ def sync_contracts():
     cust_map = { c.get('PriorityCustomerNumber'): c['CustomerID']
                  for c in atera_customers if c.get('PriorityCustomerNumber') }
 
+    # 3) Decide which contracts to sync and for which Atera customer
+    contracts_to_sync = []  # [(contract, Atera CustomerID)]
+    # The cursor must not move past contracts whose customer is not in Atera yet, or they
+    # would not be pulled again once it is. Like before the cursor existed, they are retried
+    # for PULL_PERIOD_DAYS at most, so one customer missing for good cannot pin the cursor.
+    cursor = sync_started
+    oldest_cursor = sync_started - timedelta(days=PULL_PERIOD_DAYS)
     for contract in priority_contracts:
         custname = contract.get('CUSTNAME')
         custdes = contract.get('CUSTDES', '')  # We'll look up the customer by CUSTDES
@@ -962,19 +1319,35 @@ def sync_contracts():
         customer_id = cust_map.get(custname)
         if not customer_id:
             log_json("ERROR", f"No matching Atera customer for Priority {custname}", {"contract": contract})
+            udate = parse_api_datetime(contract['UDATE'])
+            if udate is None:
+                log_json("ERROR", "Unparseable UDATE on contract, retrying it for PULL_PERIOD_DAYS", {"contract": contract})
+                udate = oldest_cursor
+            elif udate < oldest_cursor:
+                log_json("ERROR", f"Contract has waited more than {PULL_PERIOD_DAYS} days for its Atera customer; "
+                                  "it will not be retried until it changes in Priority", {"contract": contract})
+            cursor = max(min(cursor, udate), oldest_cursor)
             continue
 
-        # Fetch existing Atera contracts
-        atera_contracts = get_atera_contracts_for_customer(customer_id)
+        contracts_to_sync.append((contract, customer_id))
+
+    # 4) Fetch the existing Atera contracts of each customer involved once, customers concurrently,
+    #    then the 'Priority Contract Number' of all of those contracts in one concurrent batch
+    customer_ids = list(dict.fromkeys(customer_id for _, customer_id in contracts_to_sync))
+    with ThreadPoolExecutor(max_workers=ATERA_MAX_WORKERS) as executor:
+        atera_contracts = dict(zip(customer_ids, executor.map(get_atera_contracts_for_customer, customer_ids)))
+    contract_docnos = get_atera_contract_custom_fields(
+        (a_contract['ContractID'] for contracts in atera_contracts.values() for a_contract in contracts),
+        "Priority Contract Number")
+
+    # 5) Create the contracts Atera does not have yet
+    created_docnos = set()  # (CustomerID, DOCNO) created in this run
+    for contract, customer_id in contracts_to_sync:
+        doc_no = contract['DOCNO']
         # Check if DOCNO exists
-        exists = False
-        a_contract_id = None
-        for a_contract in atera_contracts:
-            a_contract_id = a_contract['ContractID']
-            a_contract_docno = get_atera_contract_custom_field(a_contract_id, "Priority Contract Number")
-            if a_contract_docno == doc_no:
-                exists = True
-                break
+        a_contract_id = next((a_contract['ContractID'] for a_contract in atera_contracts[customer_id]
+                              if contract_docnos[a_contract['ContractID']] == doc_no), None)
+        exists = a_contract_id is not None or (customer_id, doc_no) in created_docnos
 
         if exists:
             log_json("INFO", "Contract already exists in Atera, skipping", {
@@ -984,6 +1357,12 @@ def sync_contracts():
         else:
             log_json("INFO", "Creating contract in Atera", {"contract": contract})
             create_atera_contract(customer_id, contract)
+            created_docnos.add((customer_id, doc_no))
+
+    # Only advance the cursor after every contract went through, and not past a skipped one
+    if cursor < sync_started:
+        log_json("INFO", "Keeping the contracts cursor at the oldest contract without an Atera customer.", {"cursor": odata_datetime(cursor)})
+    save_sync_state('contracts', odata_datetime(cursor))
 
 # ------------------- MAIN FUNCTION -------------------
 def main():
@@ -994,15 +1373,19 @@ def main():
     else:
         log_json("INFO", "Customer sync disabled in config.")
 
+    # Contacts, contracts and tickets only need the customers to be in place, not each
+    # other, so they run side by side. They share the per-run cache (the Atera customer
+    # list is fetched once) and every enabled sync runs even if another one fails.
+    syncs = []
     if SYNC_CONTACTS:
         log_json("INFO", "Syncing contacts from Priority to Atera...")
-        sync_contacts()
+        syncs.append(sync_contacts)
     else:
         log_json("INFO", "Contact sync disabled in config.")
 
     if SYNC_CONTRACTS:
         log_json("INFO", "Syncing contracts from Priority to Atera...")
-        sync_contracts()
+        syncs.append(sync_contracts)
     else:
         log_json("INFO", "Contract sync disabled in config.")
 
@@ -1019,10 +1402,16 @@ def main():
     #     log_json("INFO", "Delete all customers disabled in config.")
 
     if SYNC_TICKETS:
-        sync_tickets()
+        syncs.append(sync_tickets)
     else:
         log_json("INFO", "Ticket sync disabled in config.")
 
+    if syncs:
+        with ThreadPoolExecutor(max_workers=len(syncs)) as executor:
+            futures = [executor.submit(sync) for sync in syncs]
+        for future in futures:
+            future.result()
+
 if __name__ == "__main__":
     main()
 
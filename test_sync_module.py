@@ -1,23 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
 import pytest
-from unittest.mock import patch, call
+import requests
+from unittest.mock import DEFAULT, call
+
+from main import sync_contracts, sync_customers, sync_contacts, sync_tickets, clear_run_cache, get_atera_tickets, get_atera_custom_field, main, TokenBucket
+
+@pytest.fixture(autouse=True)
+def sync_state_file(tmp_path, mocker):
+    """Keep the last-sync state file out of the project folder."""
+    state_file = tmp_path / 'last_sync.json'
+    mocker.patch('main.SYNC_STATE_FILE', str(state_file))
+    return state_file
+
+@pytest.fixture(autouse=True)
+def fresh_run_cache():
+    """Each test is its own sync run, so it must not see Atera lookups cached by another."""
+    clear_run_cache()
+    yield
+    clear_run_cache()
+
+def make_response(status_code, body=None):
+    """
+    A minimal stand-in for requests.Response, much cheaper to build and call than a MagicMock.
+    `content` holds the encoded body, so parse_json takes its orjson path when orjson is installed.
+    """
+    def raise_for_status():
+        if status_code >= 400:
+            raise requests.HTTPError(f"{status_code} Error")
 
-from main import sync_contracts, sync_customers, sync_contacts, sync_tickets
+    return SimpleNamespace(status_code=status_code, json=lambda: body, content=json.dumps(body).encode(), text='',
+                           raise_for_status=raise_for_status)
+
+def url_router(routes):
+    """
+    Build a GET side_effect that dispatches on the URL through one compiled regex instead of
+    an if/elif ladder. `routes` maps a pattern, matched from the start of the URL, to the
+    (status_code, json_body) to answer with; the first pattern that matches wins.
+    Each route's response is built once and returned for every matching request.
+    """
+    responses = [make_response(status_code, body) for status_code, body in routes.values()]
+    dispatch = re.compile('|'.join(f'(?P<route{i}>{pattern})' for i, pattern in enumerate(routes)))
 
-# Test for syncing customers
-def test_sync_customers_update(mocker):
+    def side_effect(url, *args, **kwargs):
+        match = dispatch.match(url)
+        if match is None:
+            raise ValueError(f"Unhandled URL: {url}")
+        return responses[int(match.lastgroup[len('route'):])]
+
+    return side_effect
+
+# Records shared by several tests. Tests overlay the fields they vary ({**RECORD, 'FIELD': ...})
+# rather than rebuilding the whole literal. The overlay is also a copy, which matters because
+# main fills in fields on the records it is given (e.g. PriorityCustomerNumber on Atera customers).
+PRIORITY_CUSTOMER = {
+    'CUSTNAME': 'CUST001',
+    'CUSTDES': 'Customer One',
+    'PHONE': '1234567890',
+    'ADDRESS': '123 Main St',
+    'STATE': 'CA',
+    'ZIP': '90001',
+}
+
+ATERA_CUSTOMER = {
+    'CustomerID': 1,
+    'CustomerName': 'Customer One',
+}
+
+PRIORITY_CONTRACT = {
+    'CUSTNAME': 'T003283',
+    'CUSTDES': 'Customer One',
+    'DOCNO': 'CONTRACT001',
+    'UDATE': '2025-02-01T00:00:00Z',
+    'VALIDDATE': '2025-02-01T00:00:00Z',
+    'EXPIRYDATE': '2025-12-31T00:00:00Z',
+    'UNI_DESC': 'Sample Contract'
+}
+
+# Test for syncing customers. The two scenarios are independent runs: a customer matched by
+# name whose 'Priority Customer Number' is not set yet, and one already linked by ID whose phone changed.
+@pytest.mark.parametrize("priority_phone, atera_customer_number, custom_field_response, writes_custom_field", [
+    pytest.param('1234567890', None, (404, None), True, id="initial"),
+    pytest.param('0987654321', 'CUST001', (200, [{'ValueAsString': 'CUST001'}]), False, id="phone_changed"),
+])
+def test_sync_customers_update(mocker, priority_phone, atera_customer_number, custom_field_response, writes_custom_field):
     # Define test data
     priority_customer = {
         'value': [
-            {
-                'CUSTNAME': 'CUST001',
-                'CUSTDES': 'Customer One',
-                'PHONE': '1234567890',
-                'ADDRESS': '123 Main St',
-                'STATE': 'CA',
-                'ZIP': '90001',
-                'MARH_UDATE': datetime.utcnow().isoformat() + 'Z'  # Add MARH_UDATE
-            }
+            {**PRIORITY_CUSTOMER, 'PHONE': priority_phone, 'MARH_UDATE': datetime.utcnow().isoformat() + 'Z'}
         ]
     }
 
@@ -26,41 +101,24 @@ def test_sync_customers_update(mocker):
         'totalItemCount': 1,
         'itemsInPage': 1,
         'items': [
-            {
-                'CustomerID': 1,
-                'CustomerName': 'Customer One',
-                'PriorityCustomerNumber': None,
-            }
+            {**ATERA_CUSTOMER, 'PriorityCustomerNumber': atera_customer_number}
         ]
     }
 
     # Mock responses for requests.get
-    def mock_get_side_effect(url, *args, **kwargs):
-        if 'CUSTOMERS' in url:  # Adjusted to handle any URL containing 'CUSTOMERS'
-            response = mocker.MagicMock()
-            response.status_code = 200
-            response.json.return_value = priority_customer
-            return response
-        elif url == "https://app.atera.com/api/v3/customers":
-            response = mocker.MagicMock()
-            response.status_code = 200
-            response.json.return_value = atera_customer
-            return response
-        elif url.startswith("https://app.atera.com/api/v3/customvalues/customerfield/"):
-            response = mocker.MagicMock()
-            response.status_code = 404  # Custom field not found
-            return response
-        else:
-            raise ValueError(f"Unhandled URL: {url}")
+    mock_get_side_effect = url_router({
+        r'.*CUSTOMERS': (200, priority_customer),
+        r'https://app\.atera\.com/api/v3/customers$': (200, atera_customer),
+        r'https://app\.atera\.com/api/v3/customvalues/customerfield/': custom_field_response,
+    })
 
     # Apply the side effect to the patched get requests
-    mocker.patch('main.requests.get', side_effect=mock_get_side_effect)
-    mock_put = mocker.patch('main.requests.put')
-    mock_post = mocker.patch('main.requests.post')
-    mock_put.return_value = mocker.MagicMock(status_code=200)
-    mock_post.return_value = mocker.MagicMock(status_code=200, json=lambda: {'ActionID': 1})
+    mocker.patch('main.SESSION.get', side_effect=mock_get_side_effect)
+    mock_put = mocker.patch('main.SESSION.put')
+    mock_post = mocker.patch('main.SESSION.post')
+    mock_put.return_value = make_response(200)
+    mock_post.return_value = make_response(200, {'ActionID': 1})
 
-    # Run initial sync
     sync_customers()
 
     # Verify PUT request to update customer in Atera
@@ -76,7 +134,7 @@ def test_sync_customers_update(mocker):
             "City": "",
             "State": "",
             "Country": "",
-            "Phone": "1234567890",
+            "Phone": priority_phone,
             "Fax": "",
             "Notes": "",
             "Links": "",
@@ -86,91 +144,16 @@ def test_sync_customers_update(mocker):
         }
     )
 
-    # Verify PUT request to update 'Priority Customer Number' custom field
+    # The 'Priority Customer Number' custom field is only written when it does not hold CUST001 yet
     expected_custom_field_url = "https://app.atera.com/api/v3/customvalues/customerfield/1/Priority%20Customer%20Number"
-    mock_put.assert_any_call(
-        expected_custom_field_url,
-        headers={'X-Api-Key': mocker.ANY, 'Content-Type': 'application/json', 'Accept': 'text/html'},
-        json={"Value": "CUST001"}
-    )
-
-    # Modify Priority customer data
-    priority_customer_updated = {
-        'value': [
-            {
-                'CUSTNAME': 'CUST001',
-                'CUSTDES': 'Customer One',
-                'PHONE': '0987654321',  # Changed phone number
-                'ADDRESS': '123 Main St',
-                'STATE': 'CA',
-                'ZIP': '90001',
-                'MARH_UDATE': datetime.utcnow().isoformat() + 'Z'  # Add MARH_UDATE
-            }
-        ]
-    }
-
-    # Update mock responses for the modified data
-    def mock_get_side_effect_updated(url, *args, **kwargs):
-        if 'CUSTOMERS' in url:
-            response = mocker.MagicMock()
-            response.status_code = 200
-            response.json.return_value = priority_customer_updated
-            return response
-        elif url == "https://app.atera.com/api/v3/customers":
-            updated_atera_customer = {
-                'totalPages': 1,
-                'totalItemCount': 1,
-                'itemsInPage': 1,
-                'items': [
-                    {
-                        'CustomerID': 1,
-                        'CustomerName': 'Customer One',
-                        'PriorityCustomerNumber': 'CUST001',
-                    }
-                ]
-            }
-            response = mocker.MagicMock()
-            response.status_code = 200
-            response.json.return_value = updated_atera_customer
-            return response
-        elif url.startswith("https://app.atera.com/api/v3/customvalues/customerfield/"):
-            response = mocker.MagicMock()
-            response.status_code = 200
-            response.json.return_value = [{'ValueAsString': 'CUST001'}]
-            return response
-        else:
-            raise ValueError(f"Unhandled URL: {url}")
-
-    mocker.patch('main.requests.get', side_effect=mock_get_side_effect_updated)
-
-    # Reset mocks
-    mock_put.reset_mock()
-    mock_post.reset_mock()
-
-    # Run sync again
-    sync_customers()
-
-    # Verify that the customer was updated with new phone number
-    mock_put.assert_any_call(
-        expected_put_url,
-        headers={'X-Api-Key': mocker.ANY, 'Content-Type': 'application/json', 'Accept': 'application/json'},
-        json={
-            "CustomerName": "Customer One",
-            "BusinessNumber": "",
-            "Domain": "",
-            "Address": "123 Main St",
-            "City": "",
-            "State": "",
-            "Country": "",
-            "Phone": "0987654321",  # Updated phone number
-            "Fax": "",
-            "Notes": "",
-            "Links": "",
-            "Longitude": 0,
-            "Latitude": 0,
-            "ZipCodeStr": "90001"
-        }
-    )
+    if writes_custom_field:
+        mock_put.assert_any_call(
+            expected_custom_field_url,
+            headers={'X-Api-Key': mocker.ANY, 'Content-Type': 'application/json', 'Accept': 'text/html'},
+            json={"Value": "CUST001"}
+        )
+    else:
+        assert all(c.args[0] != expected_custom_field_url for c in mock_put.call_args_list)
 
     print("Customer sync test passed.")
 
@@ -239,35 +222,18 @@ def test_sync_contacts_create_partial(mocker):
     }
 
     # Mock responses for requests.get
-    def mock_get_side_effect(url, *args, **kwargs):
-        if 'PHONEBOOK' in url:
-            response = mocker.MagicMock()
-            response.status_code = 200
-            response.json.return_value = priority_contacts
-            return response
-        elif url.startswith("https://app.atera.com/api/v3/contacts"):
-            response = mocker.MagicMock()
-            response.status_code = 200
-            response.json.return_value = atera_contacts
-            return response
-        elif url == "https://app.atera.com/api/v3/customers":
-            response = mocker.MagicMock()
-            response.status_code = 200
-            response.json.return_value = atera_customers
-            return response
-        elif url.startswith("https://app.atera.com/api/v3/customvalues/customerfield/"):
-            response = mocker.MagicMock()
-            response.status_code = 200
-            response.json.return_value = [{'ValueAsString': 'CUST001'}]
-            return response
-        else:
-            raise ValueError(f"Unhandled URL: {url}")
-
-    mocker.patch('main.requests.get', side_effect=mock_get_side_effect)
-    mock_post = mocker.patch('main.requests.post')
-    mock_put = mocker.patch('main.requests.put')
-    mock_post.return_value = mocker.MagicMock(status_code=200, json=lambda: {'ActionID': 2})
-    mock_put.return_value = mocker.MagicMock(status_code=200)
+    mock_get_side_effect = url_router({
+        r'.*PHONEBOOK': (200, priority_contacts),
+        r'https://app\.atera\.com/api/v3/contacts': (200, atera_contacts),
+        r'https://app\.atera\.com/api/v3/customers$': (200, atera_customers),
+        r'https://app\.atera\.com/api/v3/customvalues/customerfield/': (200, [{'ValueAsString': 'CUST001'}]),
+    })
+
+    mocker.patch('main.SESSION.get', side_effect=mock_get_side_effect)
+    mock_post = mocker.patch('main.SESSION.post')
+    mock_put = mocker.patch('main.SESSION.put')
+    mock_post.return_value = make_response(200, {'ActionID': 2})
+    mock_put.return_value = make_response(200)
 
     # Run sync
     sync_contacts()
@@ -279,26 +245,100 @@ def test_sync_contacts_create_partial(mocker):
     ]
     assert len(create_calls) == 2, "Expected 2 contacts to be created."
 
+    # Contacts are created concurrently, so look each one up by last name
+    created = {c.kwargs['json']['Lastname']: c.kwargs['json'] for c in create_calls}
+
     # Check data for first contact (Alice)
-    data_alice = create_calls[0].kwargs['json']
+    data_alice = created['Alice']
     assert data_alice['Firstname'] == 'Alice'
     assert data_alice['Lastname'] == 'Alice'  # Last name missing, use first name
     assert data_alice['Email'] == 'alicealice1@example.com'  # Generated email
 
     # Check data for second contact (Smith)
-    data_smith = create_calls[1].kwargs['json']
+    data_smith = created['Smith']
     assert data_smith['Firstname'] == 'Bob Smith'  # First name missing
     assert data_smith['Lastname'] == 'Smith'
     assert data_smith['Email'] == 'bob@example.com'  # Provided email
 
     print("Contacts sync test passed.")
 
+def test_sync_contacts_generated_emails_unique(mocker):
+    """
+    Test that two different contacts whose names sanitize to the same generated email
+    get distinct emails, and that an email already owned in Atera is not reused.
+    """
+    def priority_contact(first_name, last_name):
+        return {'CUSTNAME': 'CUST001', 'EMAIL': '', 'NAME': '', 'FIRSTNAME': first_name,
+                'LASTNAME': last_name, 'POSITIONDES': '', 'PHONENUM': '', 'CELLPHONE': ''}
+
+    priority_contacts = {'value': [
+        priority_contact('Al', 'Ice'),
+        priority_contact('Ali', 'Ce'),
+        priority_contact('Bob', 'Stone'),
+    ]}
+    atera_contacts = {
+        'totalPages': 1,
+        'items': [{'EndUserID': 7, 'CustomerID': 1, 'Firstname': 'Bo', 'Lastname': 'Bstone',
+                   'Email': 'bobstone1@example.com'}]
+    }
+    atera_customers = {'totalPages': 1, 'items': [{'CustomerID': 1, 'CustomerName': 'Customer One'}]}
+
+    mocker.patch('main.SESSION.get', side_effect=url_router({
+        r'.*PHONEBOOK': (200, priority_contacts),
+        r'https://app\.atera\.com/api/v3/contacts': (200, atera_contacts),
+        r'https://app\.atera\.com/api/v3/customers$': (200, atera_customers),
+        r'https://app\.atera\.com/api/v3/customvalues/customerfield/': (200, [{'ValueAsString': 'CUST001'}]),
+    }))
+    mock_post = mocker.patch('main.SESSION.post')
+    mock_put = mocker.patch('main.SESSION.put')
+    mock_post.return_value = make_response(200, {'ActionID': 2})
+    mock_put.return_value = make_response(200)
+
+    sync_contacts()
+
+    created_emails = [
+        call.kwargs['json']['Email'] for call in mock_post.call_args_list
+        if call.args[0] == "https://app.atera.com/api/v3/contacts"
+    ]
+    # Writes run concurrently, so only the set of generated emails is deterministic
+    assert sorted(created_emails) == ['alice1-2@example.com', 'alice1@example.com', 'bobstone1-2@example.com']
+    mock_put.assert_not_called()
+    print("test_sync_contacts_generated_emails_unique passed.")
+
+def test_sync_contacts_shared_email_not_merged(mocker):
+    """
+    Test that two Priority contacts sharing one address (e.g. an office mailbox) are not
+    both written to the Atera contact that matches only one of them by name.
+    """
+    shared = {'CUSTNAME': 'CUST001', 'EMAIL': 'office@acme.com', 'NAME': '', 'POSITIONDES': '',
+              'PHONENUM': '', 'CELLPHONE': ''}
+    priority_contacts = {'value': [
+        {**shared, 'FIRSTNAME': 'John', 'LASTNAME': 'Doe'},
+        {**shared, 'FIRSTNAME': 'Jane', 'LASTNAME': 'Roe'},
+    ]}
+    atera_contacts = {'totalPages': 1, 'items': [
+        {'EndUserID': 5, 'CustomerID': 1, 'Firstname': 'John', 'Lastname': 'Doe', 'Email': 'office@acme.com'}
+    ]}
+
+    mocker.patch('main.SESSION.get', side_effect=url_router({
+        r'.*PHONEBOOK': (200, priority_contacts),
+        r'https://app\.atera\.com/api/v3/contacts': (200, atera_contacts),
+        r'https://app\.atera\.com/api/v3/customers$': (200, {'totalPages': 1, 'items': [{**ATERA_CUSTOMER}]}),
+        r'https://app\.atera\.com/api/v3/customvalues/customerfield/': (200, [{'ValueAsString': 'CUST001'}]),
+    }))
+    mock_post = mocker.patch('main.SESSION.post', return_value=make_response(200))
+
+    sync_contacts()
+
+    posts = {c.args[0]: c.kwargs['json'] for c in mock_post.call_args_list}
+    assert len(mock_post.call_args_list) == 2
+    assert posts["https://app.atera.com/api/v3/contacts/5"]['Firstname'] == 'John'
+    assert posts["https://app.atera.com/api/v3/contacts"]['Firstname'] == 'Jane'
+    print("test_sync_contacts_shared_email_not_merged passed.")
+
 def test_sync_tickets(mocker):
-    # Configure the cutoff date
-    days_back = 2
-    cutoff_date = datetime.utcnow().replace(tzinfo=timezone.utc) - timedelta(days=days_back)
     # Mock ticket creation date to be recent
-    recent_date_str = datetime.utcnow().isoformat()
+    recent_date_str = datetime.now(timezone.utc).isoformat()
 
     # Mocked tickets from Atera (created in the last 2 days)
     atera_tickets_response = {
@@ -335,46 +375,20 @@ def test_sync_tickets(mocker):
     }
 
     # Mock GET requests
-    def mock_get_side_effect(url, *args, **kwargs):
-        if "tickets" in url and not "ticketfield" in url:
-            # Tickets from Atera
-            response = mocker.MagicMock()
-            response.status_code = 200
-            response.json.return_value = atera_tickets_response
-            return response
-        elif "customers" in url and "customervalues" not in url:
-            # Atera customers
-            response = mocker.MagicMock()
-            response.status_code = 200
-            response.json.return_value = atera_customers_response
-            return response
-        elif "customerfield" in url:
-            # Custom field fetch
-            response = mocker.MagicMock()
-            response.status_code = 200
-            response.json.return_value = [{'ValueAsString': 'CUST002'}]
-            return response
-        elif "ticketfield" in url:
-            # Handle ticket custom field requests
-            response = mocker.MagicMock()
-            response.status_code = 200
-            if "Technician%20Billable%20Hours" in url:
-                response.json.return_value = [{'ValueAsString': '2.5'}]
-            elif "Payment" in url:
-                response.json.return_value = [{'ValueAsString': 'Regular'}]
-            return response
-        else:
-            raise ValueError(f"Unhandled URL: {url}")
+    mock_get_side_effect = url_router({
+        r'.*ticketfield.*Technician%20Billable%20Hours': (200, [{'ValueAsString': '2.5'}]),
+        r'.*ticketfield.*Payment': (200, [{'ValueAsString': 'Regular'}]),
+        r'.*tickets': (200, atera_tickets_response),  # Tickets from Atera
+        r'.*customerfield': (200, [{'ValueAsString': 'CUST002'}]),  # Custom field fetch
+        r'.*customers': (200, atera_customers_response),  # Atera customers
+    })
 
-    mocker.patch('main.requests.get', side_effect=mock_get_side_effect)
+    mocker.patch('main.SESSION.get', side_effect=mock_get_side_effect)
 
     # Mock POST requests (to Priority and maybe Atera if needed)
-    mock_post = mocker.patch('main.requests.post')
+    mock_post = mocker.patch('main.SESSION.post')
     # Priority response
-    mock_priority_response = mocker.MagicMock()
-    mock_priority_response.status_code = 201
-    mock_priority_response.json.return_value = {}
-    mock_post.return_value = mock_priority_response
+    mock_post.return_value = make_response(201, {})
 
     # Run the sync_tickets function
     sync_tickets()
@@ -400,180 +414,78 @@ def test_sync_tickets(mocker):
     assert priority_call.kwargs['json'] == expected_data, "Data sent to Priority does not match expected."
     print("Tickets sync test passed.")
 
-def test_sync_contracts_create_new(mocker):
+def test_get_atera_tickets_stops_after_cutoff_when_newest_first(mocker):
     """
-    Test that a new contract from Priority is created in Atera
-    if no matching 'Priority Contract Number' is found.
+    Test that ticket paging stops at the first page ending before the cutoff when
+    Atera returns tickets newest first, and reads every page otherwise.
     """
-    # Mock Priority API URL
-    mocker.patch('main.PRIORITY_API_URL', 'http://test-priority-api')
-
-    # Priority contracts (one contract) - updated recently
-    priority_contracts = {
-        'value': [
-            {
-                'CUSTNAME': 'CUST001',
-                'CUSTDES': 'Customer One',
-                'DOCNO': 'CONTRACT001',
-                'UDATE': datetime.utcnow().isoformat() + 'Z',  # updated now
-                'VALIDDATE': '2025-02-01T00:00:00Z',
-                'EXPIRYDATE': '2025-12-31T00:00:00Z',
-                'STATDES': 'Active',
-                'UNI_DESC': 'Sample Contract'
-            }
-        ]
-    }
-
-    # Mock Priority customers
-    priority_customers = [
-        {
-            'CUSTNAME': 'CUST001',
-            'CUSTDES': 'Customer One',
-            'STATDES': 'פעיל'  # Active in Hebrew
-        }
-    ]
-
-    # Atera customers (matching Priority customer)
-    atera_customers = {
-        'items': [
-            {
-                'CustomerID': 999,
-                'CustomerName': 'Customer One',
-                'PriorityCustomerNumber': 'CUST001'
-            }
-        ]
-    }
-
-    # Atera contracts for this customer -> empty
-    atera_contracts_empty = {
-        'items': [],
-        'page': 1,
-        'itemsInPage': 0,
-        'totalPages': 1
-    }
-
-    # Mock fetch Priority contracts
-    mock_get_priority_contracts = mocker.patch('main.get_priority_contracts')
-    mock_get_priority_contracts.return_value = priority_contracts['value']
-
-    # Mock fetch Priority customers
-    mock_get_priority_customers = mocker.patch('main.get_priority_customers')
-    mock_get_priority_customers.return_value = priority_customers
-
-    # Mock get Atera customers
-    mock_get_atera_customers = mocker.patch('main.get_atera_customers')
-    mock_get_atera_customers.return_value = atera_customers['items']
-
-    # Mock get Atera contracts for a customer (no existing contracts)
-    mock_get_atera_contracts_for_customer = mocker.patch('main.get_atera_contracts_for_customer')
-    mock_get_atera_contracts_for_customer.return_value = atera_contracts_empty['items']
-
-    # Mock create contract
-    mock_create_atera_contract = mocker.patch('main.create_atera_contract')
-
-    # Run
-    sync_contracts()
-
-    # Assert we tried to create it
-    mock_create_atera_contract.assert_called_once()
-    args, kwargs = mock_create_atera_contract.call_args
-    customer_id_arg, contract_arg = args
-    assert customer_id_arg == 999
-    assert contract_arg['DOCNO'] == 'CONTRACT001'
-    print("test_sync_contracts_create_new passed.")
-
-def test_sync_contracts_skip_existing(mocker):
+    now = datetime.utcnow()
+
+    def page(*days_ago):
+        return [{'TicketID': d, 'TicketCreatedDate': (now - timedelta(days=d)).isoformat() + 'Z'} for d in days_ago]
+
+    def mock_pages(pages):
+        def side_effect(url, *args, params=None, **kwargs):
+            return make_response(200, {'items': pages[params['page'] - 1], 'totalPages': len(pages)})
+        return mocker.patch('main.SESSION.get', side_effect=side_effect)
+
+    mocker.patch('main.ATERA_MAX_WORKERS', 1)
+
+    mock_get = mock_pages([page(0, 1), page(1, 5), page(6, 7)])
+    tickets = get_atera_tickets(2)
+    assert [t['TicketID'] for t in tickets] == [0, 1, 1]
+    assert mock_get.call_count == 2, "Pages after the cutoff should not be fetched."
+
+    mock_get = mock_pages([page(7, 1), page(0, 6), page(5, 1)])
+    tickets = get_atera_tickets(2)
+    assert [t['TicketID'] for t in tickets] == [1, 0, 1]
+    assert mock_get.call_count == 3
+    print("test_get_atera_tickets_stops_after_cutoff_when_newest_first passed.")
+
+@pytest.mark.parametrize("atera_contracts, expect_create", [
+    pytest.param([], True, id="create_new"),
+    pytest.param([{"ContractID": 1234, "ContractName": "Sample Contract"}], False, id="skip_existing"),
+])
+def test_sync_contracts_create_or_skip(mocker, atera_contracts, expect_create):
     """
-    Test that if the contract's DOCNO already exists in Atera (via custom field),
-    we skip creating a new one.
+    A Priority contract is created in Atera unless one of the customer's Atera contracts
+    already carries its DOCNO in the 'Priority Contract Number' custom field.
     """
     # Mock Priority API URL
     mocker.patch('main.PRIORITY_API_URL', 'http://test-priority-api')
 
-    # Priority contracts (one contract) - updated recently
-    priority_contracts = {
-        'value': [
-            {
-                'CUSTNAME': 'CUST001',
-                'CUSTDES': 'Customer One',
-                'DOCNO': 'CONTRACT001',
-                'UDATE': datetime.utcnow().isoformat() + 'Z',  # updated now
-                'VALIDDATE': '2025-02-01T00:00:00Z',
-                'EXPIRYDATE': '2025-12-31T00:00:00Z',
-                'STATDES': 'Active',
-                'UNI_DESC': 'Sample Contract'
-            }
-        ]
-    }
-
-    # Mock Priority customers
-    priority_customers = [
-        {
-            'CUSTNAME': 'CUST001',
-            'CUSTDES': 'Customer One',
-            'STATDES': 'פעיל'  # Active in Hebrew
-        }
-    ]
-
-    # Atera customers
-    atera_customers = {
-        'items': [
-            {
-                'CustomerID': 999,
-                'CustomerName': 'Customer One',
-                'PriorityCustomerNumber': 'CUST001'
-            }
-        ]
-    }
-
-    # Atera already has a contract with the same DOCNO in its custom field
-    atera_contracts_with_one = {
-        'items': [
-            {
-                "ContractID": 1234,
-                "ContractName": "Sample Contract",
-            }
-        ],
-        'page': 1,
-        'itemsInPage': 1,
-        'totalPages': 1
-    }
-
-    # Mock fetch Priority contracts
-    mock_get_priority_contracts = mocker.patch('main.get_priority_contracts')
-    mock_get_priority_contracts.return_value = priority_contracts['value']
-
-    # Mock fetch Priority customers
-    mock_get_priority_customers = mocker.patch('main.get_priority_customers')
-    mock_get_priority_customers.return_value = priority_customers
-
-    # Mock get Atera customers
-    mock_get_atera_customers = mocker.patch('main.get_atera_customers')
-    mock_get_atera_customers.return_value = atera_customers['items']
-
-    # Mock get Atera contracts
-    mock_get_atera_contracts_for_customer = mocker.patch('main.get_atera_contracts_for_customer')
-    mock_get_atera_contracts_for_customer.return_value = atera_contracts_with_one['items']
-
-    # Mock contract custom field fetch to return 'CONTRACT001' => means already exists
+    # One Priority contract, updated recently, of an active customer known to Atera
+    mocker.patch('main.get_priority_contracts', return_value=[
+        {**PRIORITY_CONTRACT, 'CUSTNAME': 'CUST001', 'UDATE': datetime.utcnow().isoformat() + 'Z', 'STATDES': 'Active'}
+    ])
+    mocker.patch('main.get_priority_customers', return_value=[
+        {'CUSTNAME': 'CUST001', 'CUSTDES': 'Customer One', 'STATDES': 'פעיל'}  # Active in Hebrew
+    ])
+    mocker.patch('main.get_atera_customers', return_value=[
+        {**ATERA_CUSTOMER, 'CustomerID': 999, 'PriorityCustomerNumber': 'CUST001'}
+    ])
+    mocker.patch('main.get_atera_contracts_for_customer', return_value=atera_contracts)
+
+    # Contract 1234 already holds CONTRACT001 in its custom field
     def mock_get_atera_contract_custom_field_side_effect(contract_id, field_name):
         if contract_id == 1234 and field_name == 'Priority Contract Number':
             return 'CONTRACT001'
         return None
 
-    mock_get_atera_contract_custom_field = mocker.patch(
-        'main.get_atera_contract_custom_field',
-        side_effect=mock_get_atera_contract_custom_field_side_effect
-    )
-
+    mocker.patch('main.get_atera_contract_custom_field', side_effect=mock_get_atera_contract_custom_field_side_effect)
     mock_create_atera_contract = mocker.patch('main.create_atera_contract')
 
     # Run
     sync_contracts()
 
-    # Assert we did NOT create a new contract (skip logic)
-    mock_create_atera_contract.assert_not_called()
-    print("test_sync_contracts_skip_existing passed.")
+    if expect_create:
+        mock_create_atera_contract.assert_called_once()
+        customer_id_arg, contract_arg = mock_create_atera_contract.call_args.args
+        assert customer_id_arg == 999
+        assert contract_arg['DOCNO'] == 'CONTRACT001'
+    else:
+        mock_create_atera_contract.assert_not_called()
+    print("test_sync_contracts_create_or_skip passed.")
 
 @pytest.fixture
 def priority_customer_fixture(request):
@@ -589,20 +501,12 @@ def priority_customer_fixture(request):
 def priority_contract_fixture(request):
     """Returns a mock Priority contract object based on param."""
     # request.param = 'active' or 'inactive'
-    return {
-        'CUSTNAME': 'T003283',
-        'CUSTDES': 'Customer One',
-        'DOCNO': 'CONTRACT001',
-        'UDATE': '2025-02-01T00:00:00Z',
-        'VALIDDATE': '2025-02-01T00:00:00Z',
-        'EXPIRYDATE': '2025-12-31T00:00:00Z',
-        'STATDES': 'מבוטל' if request.param == 'inactive' else 'Active',
-        'UNI_DESC': 'Sample Contract'
-    }
+    return {**PRIORITY_CONTRACT, 'STATDES': 'מבוטל' if request.param == 'inactive' else 'Active'}
 
 @pytest.mark.parametrize("priority_customer_fixture", ["active", "inactive"], indirect=True)
 @pytest.mark.parametrize("priority_contract_fixture", ["active", "inactive"], indirect=True)
 def test_sync_contracts(
+        mocker,
         priority_customer_fixture,
         priority_contract_fixture
 ):
@@ -614,32 +518,36 @@ def test_sync_contracts(
      4) Inactive cust + Inactive contract => skip
     """
 
-    # Setup Mocks
-    with patch("main.get_priority_customers") as mock_get_customers, \
-            patch("main.get_priority_contracts") as mock_get_contracts, \
-            patch("main.get_atera_customers") as mock_get_atera_customers, \
-            patch("main.create_atera_contract") as mock_create_atera_contract, \
-            patch("main.get_atera_contracts_for_customer", return_value=[]):
+    # Setup Mocks, all installed on main in one go
+    mocks = mocker.patch.multiple(
+        'main',
+        get_priority_customers=DEFAULT,
+        get_priority_contracts=DEFAULT,
+        get_atera_customers=DEFAULT,
+        create_atera_contract=DEFAULT,
+        get_atera_contracts_for_customer=DEFAULT,
+    )
 
-        # Mock returned data
-        mock_get_customers.return_value = [priority_customer_fixture]
-        mock_get_contracts.return_value = [priority_contract_fixture]
-        mock_get_atera_customers.return_value = [{
-            'CustomerID': 1234,
-            'PriorityCustomerNumber': 'T003283'
-        }]
+    # Mock returned data
+    mocks['get_priority_customers'].return_value = [priority_customer_fixture]
+    mocks['get_priority_contracts'].return_value = [priority_contract_fixture]
+    mocks['get_atera_customers'].return_value = [{
+        'CustomerID': 1234,
+        'PriorityCustomerNumber': 'T003283'
+    }]
+    mocks['get_atera_contracts_for_customer'].return_value = []
 
-        # Run the sync
-        sync_contracts()
+    # Run the sync
+    sync_contracts()
 
-        customer_status = priority_customer_fixture['STATDES']
-        contract_status = priority_contract_fixture['STATDES']
+    customer_status = priority_customer_fixture['STATDES']
+    contract_status = priority_contract_fixture['STATDES']
 
-        # Only if customer_status == "פעיל" AND contract_status != "מבוטל" => create
-        if customer_status == 'פעיל' and contract_status != 'מבוטל':
-            mock_create_atera_contract.assert_called_once()
-        else:
-            mock_create_atera_contract.assert_not_called()
+    # Only if customer_status == "פעיל" AND contract_status != "מבוטל" => create
+    if customer_status == 'פעיל' and contract_status != 'מבוטל':
+        mocks['create_atera_contract'].assert_called_once()
+    else:
+        mocks['create_atera_contract'].assert_not_called()
 
 def test_sync_customers_filtered_by_date(mocker):
     """
@@ -647,11 +555,10 @@ def test_sync_customers_filtered_by_date(mocker):
     are returned and processed by sync_customers().
     """
     # Suppose CUSTOMERS_PULL_PERIOD_DAYS=2
-    cutoff = datetime.utcnow().replace(tzinfo=timezone.utc) - timedelta(days=2)
-
     # We'll create two customers: one updated recently, one too old
-    recent_update = datetime.utcnow().replace(tzinfo=timezone.utc).isoformat()
-    old_update = (datetime.utcnow().replace(tzinfo=timezone.utc) - timedelta(days=10)).isoformat()
+    now = datetime.now(timezone.utc)
+    recent_update = now.isoformat()
+    old_update = (now - timedelta(days=10)).isoformat()
 
     priority_customers_response = {
         'totalPages': 1,
@@ -682,31 +589,17 @@ def test_sync_customers_filtered_by_date(mocker):
     }
 
     # Mock GET calls
-    def mock_get_side_effect(url, *args, **kwargs):
-        if 'CUSTOMERS' in url:
-            # Return both customers from Priority
-            response = mocker.MagicMock()
-            response.status_code = 200
-            response.json.return_value = priority_customers_response
-            return response
-        elif 'app.atera.com/api/v3/customers' in url and 'customerfield' not in url:
-            response = mocker.MagicMock()
-            response.status_code = 200
-            response.json.return_value = atera_customers_response
-            return response
-        elif 'customerfield' in url:
-            # Custom field doesn't exist
-            response = mocker.MagicMock()
-            response.status_code = 404
-            return response
-        else:
-            raise ValueError(f"Unhandled URL in test: {url}")
-
-    mocker.patch('main.requests.get', side_effect=mock_get_side_effect)
-    mock_post = mocker.patch('main.requests.post')
-    mock_put = mocker.patch('main.requests.put')
-    mock_post.return_value = mocker.MagicMock(status_code=201, json=lambda: {'ActionID': 123})
-    mock_put.return_value = mocker.MagicMock(status_code=200)
+    mock_get_side_effect = url_router({
+        r'.*CUSTOMERS': (200, priority_customers_response),  # Both customers from Priority
+        r'.*customerfield': (404, None),  # Custom field doesn't exist
+        r'.*app\.atera\.com/api/v3/customers': (200, atera_customers_response),
+    })
+
+    mocker.patch('main.SESSION.get', side_effect=mock_get_side_effect)
+    mock_post = mocker.patch('main.SESSION.post')
+    mock_put = mocker.patch('main.SESSION.put')
+    mock_post.return_value = make_response(201, {'ActionID': 123})
+    mock_put.return_value = make_response(200)
 
     # Run sync_customers
     sync_customers()
@@ -722,3 +615,308 @@ def test_sync_customers_filtered_by_date(mocker):
     data = create_calls[0].kwargs['json']
     assert data['CustomerName'] == 'Recent Customer'
     print("test_sync_customers_filtered_by_date passed.")
+
+def test_sync_customers_filters_since_last_sync(mocker, sync_state_file):
+    """
+    Test that sync_customers asks Priority only for customers updated since the last
+    successful run, and moves the cursor forward afterwards.
+    """
+    sync_state_file.write_text('{"customers": "2025-01-01T08:30:00Z"}')
+
+    mock_get_side_effect = url_router({
+        r'.*CUSTOMERS': (200, {'value': []}),
+        r'.*': (200, {'totalPages': 1, 'items': []}),
+    })
+
+    mock_get = mocker.patch('main.SESSION.get', side_effect=mock_get_side_effect)
+
+    sync_customers()
+
+    priority_url = mock_get.call_args_list[0].args[0]
+    assert '$filter=MARH_UDATE%20ge%202025-01-01T08%3A30%3A00Z' in priority_url
+    assert mock_get.call_count == 1, "Atera should not be read when no customer changed."
+    assert '"customers": "2025-01-01T08:30:00Z"' not in sync_state_file.read_text()
+    print("test_sync_customers_filters_since_last_sync passed.")
+
+def test_concurrent_custom_field_lookups_share_one_request(mocker):
+    """
+    Test that concurrent lookups of the same custom field wait for the request
+    already in flight instead of sending their own.
+    """
+    release = threading.Event()
+    response = make_response(200, [{'ValueAsString': 'CUST001'}])
+
+    def slow_get(url, *args, **kwargs):
+        release.wait(timeout=5)
+        return response
+
+    mock_get = mocker.patch('main.SESSION.get', side_effect=slow_get)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(get_atera_custom_field, 1, 'Priority Customer Number') for _ in range(4)]
+        time.sleep(0.05)  # Let every lookup start while the first request is still pending
+        release.set()
+
+    assert [future.result() for future in futures] == ['CUST001'] * 4
+    assert mock_get.call_count == 1
+    print("test_concurrent_custom_field_lookups_share_one_request passed.")
+
+def test_custom_field_error_is_not_cached(mocker):
+    """
+    Test that a failed custom-field lookup is raised instead of being cached as
+    "not set", so a later sync in the same run still finds the customer's contacts.
+    """
+    priority_contacts = {'value': [{
+        'CUSTNAME': 'CUST001', 'EMAIL': 'bob@example.com', 'NAME': '', 'FIRSTNAME': 'Bob',
+        'LASTNAME': 'Smith', 'POSITIONDES': '', 'PHONENUM': '', 'CELLPHONE': ''
+    }]}
+    routes = {
+        r'.*PHONEBOOK': (200, priority_contacts),
+        r'https://app\.atera\.com/api/v3/contacts': (200, {'totalPages': 1, 'items': []}),
+        r'https://app\.atera\.com/api/v3/customers$': (200, {'totalPages': 1, 'items': [{**ATERA_CUSTOMER}]}),
+    }
+    mocker.patch('main.SESSION.get', side_effect=url_router({
+        **routes, r'https://app\.atera\.com/api/v3/customvalues/customerfield/': (500, None),
+    }))
+    mock_post = mocker.patch('main.SESSION.post', return_value=make_response(200))
+
+    with pytest.raises(requests.HTTPError):
+        sync_contacts()
+    mock_post.assert_not_called()
+
+    # Same run, Atera has recovered: the field is fetched again rather than read as missing
+    mocker.patch('main.SESSION.get', side_effect=url_router({
+        **routes, r'https://app\.atera\.com/api/v3/customvalues/customerfield/': (200, [{'ValueAsString': 'CUST001'}]),
+    }))
+    sync_contacts()
+    mock_post.assert_called_once()
+    assert mock_post.call_args.kwargs['json']['CustomerID'] == 1
+    print("test_custom_field_error_is_not_cached passed.")
+
+def test_sync_contracts_filters_since_last_sync(mocker, sync_state_file):
+    """
+    Test that sync_contracts asks Priority only for contracts updated since the last
+    successful run, and moves the cursor forward afterwards.
+    """
+    sync_state_file.write_text('{"contracts": "2025-01-01T08:30:00Z"}')
+    mocker.patch('main.get_priority_customers', return_value=[])
+
+    mock_get = mocker.patch('main.SESSION.get', side_effect=url_router({
+        r'.*DOCUMENTS_Z': (200, {'value': []}),
+    }))
+
+    sync_contracts()
+
+    priority_url = mock_get.call_args_list[0].args[0]
+    assert '$filter=UDATE%20ge%202025-01-01T08%3A30%3A00Z' in priority_url
+    assert '"contracts": "2025-01-01T08:30:00Z"' not in sync_state_file.read_text()
+    print("test_sync_contracts_filters_since_last_sync passed.")
+
+def test_sync_contracts_cursor_waits_for_missing_atera_customer(mocker, sync_state_file):
+    """
+    Test that a contract skipped because its customer is not in Atera yet holds the
+    contracts cursor at its UDATE (Priority's local time, converted to UTC), so the next
+    run pulls it again.
+    """
+    udate = (datetime.now(timezone.utc) - timedelta(hours=1)).replace(microsecond=0)
+    mocker.patch('main.get_priority_customers', return_value=[
+        {'CUSTNAME': 'CUST001', 'CUSTDES': 'Customer One', 'STATDES': 'פעיל'}
+    ])
+    mock_get_priority_contracts = mocker.patch('main.get_priority_contracts', return_value=[
+        {**PRIORITY_CONTRACT, 'CUSTNAME': 'CUST001', 'STATDES': 'Active',
+         'UDATE': udate.astimezone(timezone(timedelta(hours=2))).isoformat()}  # e.g. ...T12:00:00+02:00
+    ])
+    mocker.patch('main.get_atera_customers', return_value=[])
+    mock_create_atera_contract = mocker.patch('main.create_atera_contract')
+
+    sync_contracts()
+    mock_create_atera_contract.assert_not_called()
+    assert f'"contracts": "{udate.strftime("%Y-%m-%dT%H:%M:%SZ")}"' in sync_state_file.read_text()
+
+    sync_contracts()
+    assert mock_get_priority_contracts.call_args.kwargs['since'] == udate.replace(tzinfo=None)
+    print("test_sync_contracts_cursor_waits_for_missing_atera_customer passed.")
+
+def test_sync_contracts_cursor_held_back_at_most_pull_period(mocker, sync_state_file):
+    """
+    Test that contracts waiting for their Atera customer, or with an unparseable UDATE,
+    hold the contracts cursor back by at most PULL_PERIOD_DAYS and do not abort the sync.
+    """
+    mocker.patch('main.PULL_PERIOD_DAYS', 2)
+    mocker.patch('main.get_priority_customers', return_value=[
+        {'CUSTNAME': 'CUST001', 'CUSTDES': 'Customer One', 'STATDES': 'פעיל'}
+    ])
+    mocker.patch('main.get_priority_contracts', return_value=[
+        {**PRIORITY_CONTRACT, 'CUSTNAME': 'CUST001', 'STATDES': 'Active', 'UDATE': '2020-01-01T00:00:00+02:00'},
+        {**PRIORITY_CONTRACT, 'CUSTNAME': 'CUST001', 'STATDES': 'Active', 'UDATE': '2099-03'},
+    ])
+    mocker.patch('main.get_atera_customers', return_value=[])
+    mocker.patch('main.create_atera_contract')
+
+    sync_contracts()
+
+    cursor = datetime.fromisoformat(json.loads(sync_state_file.read_text())['contracts'].replace('Z', ''))
+    assert abs(cursor - (datetime.utcnow() - timedelta(days=2))) < timedelta(minutes=1)
+    print("test_sync_contracts_cursor_held_back_at_most_pull_period passed.")
+
+def test_sync_customers_skips_unchanged_update(mocker):
+    """
+    Test that a customer whose data has not changed since the last sync is not
+    written to Atera again, and is written once it does change.
+    """
+    priority_customer = {
+        'CUSTNAME': 'CUST001',
+        'CUSTDES': 'Customer One',
+        'PHONE': '123-456-7890',
+        'MARH_UDATE': (datetime.utcnow() + timedelta(days=1)).isoformat() + 'Z'
+    }
+    atera_customers = {
+        'totalPages': 1,
+        'items': [{'CustomerID': 1, 'CustomerName': 'Customer One'}]
+    }
+    def serve(priority_customer):
+        mocker.patch('main.SESSION.get', side_effect=url_router({
+            r'.*CUSTOMERS': (200, {'value': [priority_customer]}),
+            r'https://app\.atera\.com/api/v3/customers$': (200, atera_customers),
+            r'https://app\.atera\.com/api/v3/customvalues/customerfield/': (200, [{'ValueAsString': 'CUST001'}]),
+        }))
+
+    serve(priority_customer)
+    mock_put = mocker.patch('main.SESSION.put')
+    mock_put.return_value = make_response(200)
+
+    def customer_puts():
+        return [c for c in mock_put.call_args_list if c.args[0] == "https://app.atera.com/api/v3/customers/1"]
+
+    sync_customers()
+    assert len(customer_puts()) == 1
+
+    clear_run_cache()
+    mock_put.reset_mock()
+    sync_customers()
+    assert mock_put.call_count == 0, "Unchanged customer should not be written again."
+
+    clear_run_cache()
+    serve({**priority_customer, 'PHONE': '098-765-4321'})
+    sync_customers()
+    assert len(customer_puts()) == 1
+    print("test_sync_customers_skips_unchanged_update passed.")
+
+def test_sync_contacts_no_change_no_update(mocker):
+    """
+    Test that an existing Atera contact is updated on the first sync and left
+    alone on the next one when nothing about it changed in Priority.
+    """
+    priority_contacts = {'value': [{
+        'CUSTNAME': 'CUST001', 'EMAIL': 'bob@example.com', 'NAME': '', 'FIRSTNAME': 'Bob',
+        'LASTNAME': 'Smith', 'POSITIONDES': 'Manager', 'PHONENUM': '050-1234567', 'CELLPHONE': ''
+    }]}
+    atera_contacts = {
+        'totalPages': 1,
+        'items': [{'EndUserID': 5, 'CustomerID': 1, 'Firstname': 'Bob', 'Lastname': 'Smith',
+                   'Email': 'bob@example.com'}]
+    }
+    atera_customers = {'totalPages': 1, 'items': [{'CustomerID': 1, 'CustomerName': 'Customer One'}]}
+
+    mocker.patch('main.SESSION.get', side_effect=url_router({
+        r'.*PHONEBOOK': (200, priority_contacts),
+        r'https://app\.atera\.com/api/v3/contacts': (200, atera_contacts),
+        r'https://app\.atera\.com/api/v3/customers$': (200, atera_customers),
+        r'https://app\.atera\.com/api/v3/customvalues/customerfield/': (200, [{'ValueAsString': 'CUST001'}]),
+    }))
+    mock_post = mocker.patch('main.SESSION.post')
+    mock_post.return_value = make_response(200)
+
+    sync_contacts()
+    mock_post.assert_called_once()
+    assert mock_post.call_args.args[0] == "https://app.atera.com/api/v3/contacts/5"
+
+    clear_run_cache()
+    mock_post.reset_mock()
+    sync_contacts()
+    assert mock_post.call_count == 0, "Unchanged contact should not be written again."
+    print("test_sync_contacts_no_change_no_update passed.")
+
+def test_atera_customers_shared_between_syncs(mocker):
+    """
+    Test that the Atera customer list and its custom fields are fetched once per run,
+    even when several syncs need them.
+    """
+    atera_customers = {
+        'totalPages': 1,
+        'items': [{'CustomerID': 1, 'CustomerName': 'Customer One'}]
+    }
+
+    mock_get_side_effect = url_router({
+        r'.*PHONEBOOK': (200, {'value': []}),
+        r'https://app\.atera\.com/api/v3/contacts$': (200, {'totalPages': 1, 'items': []}),
+        r'https://app\.atera\.com/api/v3/customers$': (200, atera_customers),
+        r'https://app\.atera\.com/api/v3/customvalues/customerfield/': (200, [{'ValueAsString': 'CUST001'}]),
+    })
+
+    mock_get = mocker.patch('main.SESSION.get', side_effect=mock_get_side_effect)
+
+    sync_contacts()
+    sync_contacts()
+
+    fetched_urls = [c.args[0] for c in mock_get.call_args_list]
+    assert fetched_urls.count("https://app.atera.com/api/v3/customers") == 1
+    assert len([u for u in fetched_urls if 'customerfield' in u]) == 1
+    print("test_atera_customers_shared_between_syncs passed.")
+
+def test_main_runs_downstream_syncs_on_one_customer_list(mocker):
+    """
+    Test that main() runs contacts and contracts side by side and that they share
+    a single fetch of the Atera customer list.
+    """
+    mocker.patch('main.SYNC_CUSTOMERS', False)
+    mocker.patch('main.SYNC_CONTACTS', True)
+    mocker.patch('main.SYNC_CONTRACTS', True)
+    mocker.patch('main.SYNC_TICKETS', False)
+
+    priority_contract = {'CUSTNAME': 'CUST001', 'CUSTDES': 'Customer One', 'DOCNO': 'CONTRACT001',
+                         'UDATE': (datetime.utcnow() + timedelta(days=1)).isoformat() + 'Z'}
+    mock_get = mocker.patch('main.SESSION.get', side_effect=url_router({
+        r'.*PHONEBOOK': (200, {'value': []}),
+        r'.*DOCUMENTS_Z': (200, {'value': [priority_contract]}),
+        r'.*CUSTOMERS': (200, {'value': []}),
+        r'https://app\.atera\.com/api/v3/contacts$': (200, {'totalPages': 1, 'items': []}),
+        r'https://app\.atera\.com/api/v3/customers$': (200, {'totalPages': 1, 'items': [{'CustomerID': 1}]}),
+        r'https://app\.atera\.com/api/v3/customvalues/customerfield/': (200, [{'ValueAsString': 'CUST001'}]),
+    }))
+
+    main()
+
+    fetched_urls = [c.args[0] for c in mock_get.call_args_list]
+    assert any('PHONEBOOK' in u for u in fetched_urls)
+    assert any('DOCUMENTS_Z' in u for u in fetched_urls)
+    assert fetched_urls.count("https://app.atera.com/api/v3/customers") == 1
+    print("test_main_runs_downstream_syncs_on_one_customer_list passed.")
+
+def test_token_bucket_spaces_requests_after_burst(mocker):
+    """
+    Test that the rate limiter lets a burst of `capacity` requests through at once
+    and then spaces the rest at `rate` per second.
+    """
+    clock = [100.0]
+    sleeps = []
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    mocker.patch('main.time.monotonic', side_effect=lambda: clock[0])
+    mocker.patch('main.time.sleep', side_effect=fake_sleep)
+
+    bucket = TokenBucket(rate=2, capacity=2)
+    for _ in range(5):
+        bucket.acquire()
+
+    # Two go out immediately; the next three are due 0.5s, 1.0s and 1.5s later
+    assert sleeps == [0.5, 1.0, 1.5]
+
+    clock[0] += 10  # Long idle: the bucket refills, but only up to its capacity
+    sleeps.clear()
+    for _ in range(3):
+        bucket.acquire()
+    assert sleeps == [0.5]
+    print("test_token_bucket_spaces_requests_after_burst passed.")